@@ -0,0 +1,84 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+# set by ReplicaRoutingMiddleware for the duration of a request: only reads
+# of safe-method requests from clients that didn't just write use a replica
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+class ReplicaRouter:
+    """
+    Reads go to one of settings.DATABASE_REPLICAS when the current request
+    allows it, everything else (writes, reads inside a transaction, reads
+    outside of a request) goes to the primary 'default' database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or not _read_from_replica.get():
+            return DEFAULT_DB_ALIAS
+        # a transaction must see its own writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Routes the reads of GET/HEAD/OPTIONS requests to the replicas. A client
+    that sends a write is pinned to the primary for settings.REPLICA_PIN_SECONDS
+    through a cookie, so it reads its own writes while the replicas catch up.
+
+    Async capable, so that ASGI requests to the async views stay async.
+    """
+    pin_cookie_name = 'primary_pin'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = _read_from_replica.set(self.use_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_from_replica.reset(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        token = _read_from_replica.set(self.use_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_from_replica.reset(token)
+        return self.pin(request, response)
+
+    def use_replica(self, request):
+        return request.method in SAFE_METHODS and self.pin_cookie_name not in request.COOKIES
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(self.pin_cookie_name, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
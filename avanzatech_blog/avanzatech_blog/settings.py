@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 
@@ -52,6 +53,7 @@ INSTALLED_APPS = [
     'categories',
     'permissions',
     'postCategoryPermission',
+    'feed',
 
 ]
 
@@ -64,6 +66,28 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Paginated list counts are served from the cache for at most this many
+# seconds per visibility class, ?count=exact always counts
+PAGINATION_COUNT_CACHE_TIMEOUT = 30
+
+# In-process LRU of post list responses (see posts.response_cache), bounded
+# by number of entries and approximate JSON size. Entries are dropped on any
+# post, post permission, like or comment write, and after the timeout
+POST_LIST_CACHE_MAX_ENTRIES = 1024
+POST_LIST_CACHE_MAX_BYTES = 8 * 1024 * 1024
+POST_LIST_CACHE_TIMEOUT = 30
+
+# rows read from the database and written to the client at a time by the
+# streaming post export (see posts.views.PostExport)
+POST_EXPORT_CHUNK_SIZE = 2000
+
+# the trending score of a post halves every this many hours without new
+# likes or comments (see posts.scores)
+TRENDING_HALF_LIFE_HOURS = 24
+
+# maximum number of posts returned by the trending and top rankings
+POST_RANKING_MAX_SIZE = 100
+
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
@@ -73,6 +97,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'avanzatech_blog.routers.ReplicaRoutingMiddleware',
 
     # 'django.middleware.csrf.CsrfViewMiddleware',
 ]
@@ -116,13 +141,64 @@ WSGI_APPLICATION = 'avanzatech_blog.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Run on every new SQLite connection. WAL lets readers go on while a writer
+# commits, synchronous=NORMAL only syncs the WAL at checkpoints (safe in WAL
+# mode), negative cache_size is in KiB
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# see avanzatech_blog.sqlite.base
+SQLITE_OPTIONS = {
+    'init_pragmas': SQLITE_PRAGMAS,
+    'transaction_mode': 'IMMEDIATE',
+    # seconds a write waits for the lock before "database is locked"
+    'timeout': 5,
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'avanzatech_blog.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
     }
 }
 
+# Writes still locked out after the busy timeout are retried this many times,
+# waiting SQLITE_WRITE_BACKOFF * 2 ** attempt seconds (with jitter) in between
+# (see avanzatech_blog.sqlite.writes)
+SQLITE_WRITE_RETRIES = 3
+SQLITE_WRITE_BACKOFF = 0.05
+
+# Serialize the writes of this process in an in-process queue, so its writers
+# don't contend for the SQLite lock (SQLITE_SERIALIZE_WRITES=1)
+SQLITE_SERIALIZE_WRITES = os.environ.get('SQLITE_SERIALIZE_WRITES') == '1'
+
+# Read replicas, as comma separated SQLite files in the DATABASE_REPLICAS
+# environment variable (e.g. db.replica1.sqlite3,db.replica2.sqlite3). Reads of
+# safe-method requests go to them (see avanzatech_blog.routers), locally
+# `manage.py sync_replicas` stands in for replication by copying the primary
+DATABASE_REPLICAS = []
+for index, name in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(','))):
+    alias = f'replica{index + 1}'
+    DATABASES[alias] = {
+        'ENGINE': 'avanzatech_blog.sqlite',
+        'NAME': BASE_DIR / name.strip(),
+        'OPTIONS': SQLITE_OPTIONS,
+        # tests read the replicas through the test primary
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['avanzatech_blog.routers.ReplicaRouter']
+
+# seconds a client reads from the primary after a write (read-your-writes)
+REPLICA_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
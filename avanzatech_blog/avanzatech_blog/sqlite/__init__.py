@@ -0,0 +1,2 @@
+# SQLite database backend of the project, see base.DatabaseWrapper, and the
+# retry/serialization of writes, see writes.run_write
@@ -0,0 +1,37 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    The stock SQLite backend, tuned for concurrent requests through OPTIONS:
+    - 'init_pragmas': {name: value} run on every new connection (WAL
+      journal, synchronous, page cache, mmap... see settings.SQLITE_PRAGMAS)
+    - 'transaction_mode': how atomic blocks BEGIN. With IMMEDIATE they take
+      the write lock up front: a DEFERRED transaction that reads and then
+      writes can't wait for the lock, SQLite fails it at once with
+      "database is locked" instead of going through the busy timeout
+    - 'timeout': busy timeout of the sqlite3 module, in seconds
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('init_pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('init_pragmas', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode', 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"OPTIONS['transaction_mode'] must be one of {', '.join(TRANSACTION_MODES)}.")
+        self.cursor().execute(f'BEGIN {mode}')
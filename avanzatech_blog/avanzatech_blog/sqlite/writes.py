@@ -0,0 +1,71 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+
+# the in-process write queue: with settings.SQLITE_SERIALIZE_WRITES the
+# writers of this process wait on it in turn instead of polling SQLite's lock.
+# Reentrant, a write may call another one
+_write_lock = threading.RLock()
+
+
+def is_locked(error):
+    return 'locked' in str(error)
+
+
+@contextmanager
+def write_turn(serialize=None):
+    """Waits for the turn of this thread in the write queue, when enabled."""
+    if serialize is None:
+        serialize = settings.SQLITE_SERIALIZE_WRITES
+    if not serialize:
+        yield
+        return
+    with _write_lock:
+        yield
+
+
+def run_write(func, using=DEFAULT_DB_ALIAS, serialize=None):
+    """
+    Calls func() in its write turn, and again when SQLite answers "database is
+    locked" (its busy timeout ran out): up to settings.SQLITE_WRITE_RETRIES
+    times, after an exponential backoff with jitter.
+
+    func must be safe to call again, i.e. its writes are one transaction.
+    Inside an outer transaction nothing is retried, the error goes up so the
+    outer transaction can be rolled back.
+    """
+    retries = settings.SQLITE_WRITE_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            with write_turn(serialize):
+                return func()
+        except OperationalError as error:
+            if not is_locked(error) or attempt == retries or connections[using].in_atomic_block:
+                raise
+        time.sleep(settings.SQLITE_WRITE_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def retrying_write(handler):
+    """Decorator of the view handlers that write, see run_write."""
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        return run_write(lambda: handler(*args, **kwargs))
+    return wrapper
+
+
+def last_insert(using=DEFAULT_DB_ALIAS):
+    """
+    (rows written, rowid) of the last INSERT of the connection, from SQLite's
+    changes() and last_insert_rowid(). Tells whether an INSERT ... ON CONFLICT
+    DO NOTHING (bulk_create(ignore_conflicts=True)) wrote its row, and gives
+    its primary key, which bulk_create doesn't set in that case.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT changes(), last_insert_rowid()')
+        return cursor.fetchone()
@@ -0,0 +1,570 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from base64 import b64encode
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from avanzatech_blog.routers import ReplicaRouter, ReplicaRoutingMiddleware, _read_from_replica
+from avanzatech_blog.sqlite.base import DatabaseWrapper
+from avanzatech_blog.sqlite.writes import run_write
+
+from comments.factories import CommentFactory
+from comments.models import Comment
+from likes.factories import LikeFactory
+from likes.models import Like
+from postCategoryPermission import lookups
+from posts.factories import PostFactory
+from posts.models import Post, AccessLevel
+from posts.response_cache import post_list_cache
+from teams.factories import TeamFactory
+from user.factories import CustomUserFactory
+
+
+#####################   QUERY BUDGET TESTS  #####################
+
+# Every endpoint is called by every role over growing datasets. The number
+# of SQL queries must not grow with the data (no N+1) and must stay within
+# the endpoint budget.
+
+DATASET_SIZES = [10, 100, 1000]
+
+ROLES = ['anonymous', 'authenticated', 'same_team', 'staff']
+
+# maximum number of queries per request, whatever the role. Writes include
+# the SAVEPOINT/RELEASE pair of their transaction, tests run inside one, and
+# likes and comments the F() update of their post counter and the UPDATE of
+# their PostScore (plus its INSERT for the first like or comment of a post).
+BUDGETS = {
+    'post_list': 2,
+    'post_create': 4,
+    'post_retrieve': 1,
+    'post_update': 2,
+    'post_engagement': 1,
+    'like_list': 2,
+    'like_create': 9,
+    'like_destroy': 6,
+    'like_toggle': 8,
+    'comment_list': 2,
+    'comment_create': 8,
+    'comment_destroy': 6,
+}
+
+READ_LEVELS = list(AccessLevel)
+
+
+def writer_statuses(allowed, anonymous=status.HTTP_403_FORBIDDEN):
+    """Statuses of a write: `allowed` for the users, `anonymous` refuses the anonymous one."""
+    return dict.fromkeys(ROLES, allowed) | {'anonymous': anonymous}
+
+
+class QueryBudgetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.team = TeamFactory()
+        cls.other_team = TeamFactory()
+        cls.users = {
+            'authenticated': CustomUserFactory(team_id=cls.other_team),
+            'same_team': CustomUserFactory(team_id=cls.team),
+            'staff': CustomUserFactory(team_id=cls.other_team, is_staff=True),
+        }
+        # authors of the seeded posts, the first one in the same team as 'same_team'
+        cls.authors = [CustomUserFactory(team_id=cls.team),
+                       CustomUserFactory(team_id=cls.other_team)]
+        cls.likers = cls.authors + list(cls.users.values())
+
+    def setUp(self):
+        cache.clear()
+        post_list_cache.clear()
+
+    # -----------------------------  dataset  ------------------------------#
+
+    def grow_to(self, size):
+        """Bulk insert posts (two likes and two comments each) up to `size` posts."""
+        start = Post.objects.count()
+        posts = Post.objects.bulk_create([
+            Post(title=f'post {i}', post_content=f'content {i}', excerpt=f'content {i}',
+                 author=self.authors[i % len(self.authors)],
+                 read_level=READ_LEVELS[i % len(READ_LEVELS)])
+            for i in range(start, size)])
+        Like.objects.bulk_create([
+            Like(post_id=post, author=self.likers[(post.id + offset) % len(self.likers)])
+            for post in posts for offset in range(2)])
+        Comment.objects.bulk_create([
+            Comment(post_id=post, author=self.likers[(post.id + offset) % len(self.likers)],
+                    comment_content='comment')
+            for post in posts for offset in range(2)])
+
+    def public_post(self, author=None):
+        return Post.objects.create(title='target', post_content='target',
+                                   author=author or self.authors[0],
+                                   read_level=AccessLevel.PUBLIC)
+
+    # -----------------------------  requests  -----------------------------#
+
+    def authenticate(self, role):
+        self.client.force_authenticate(user=self.users.get(role))
+        return self.users.get(role)
+
+    def count_queries(self, role, method, url, data=None):
+        user = self.authenticate(role)
+        # the lookup-table cache is loaded once per process, not per request
+        lookups.categories_by_name()
+        lookups.permissions_by_name()
+        # measures the uncached path, bulk inserts skip the invalidation signals
+        cache.clear()
+        post_list_cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format='json')
+        return len(queries), response
+
+    def measure(self, endpoint, request_for, statuses):
+        """
+        request_for(role) -> (method, url, data), called once per role and size.
+        Asserts every response has the status expected for the role in
+        `statuses` (a status for every role, or {role: status}), so the
+        budgets are measured on the path each role really takes, and that the
+        query count is flat across sizes and within budget.
+        """
+        if not isinstance(statuses, dict):
+            statuses = dict.fromkeys(ROLES, statuses)
+        counts = {role: [] for role in ROLES}
+        for size in DATASET_SIZES:
+            self.grow_to(size)
+            for role in ROLES:
+                query_count, response = self.count_queries(role, *request_for(role))
+                self.assertEqual(response.status_code, statuses[role],
+                                 f'{endpoint} answered {response.status_code} to {role}')
+                counts[role].append(query_count)
+
+        for role, role_counts in counts.items():
+            self.assertEqual(len(set(role_counts)), 1,
+                             f'{endpoint} queries grow with data for {role}: {role_counts}')
+            self.assertLessEqual(max(role_counts), BUDGETS[endpoint],
+                                 f'{endpoint} is over budget for {role}: {role_counts}')
+
+    # ------------------------------  posts  -------------------------------#
+
+    def test_post_list(self):
+        self.measure('post_list', lambda role: (
+            'get', reverse('postCreateOrList'), None), status.HTTP_200_OK)
+
+    def test_post_create(self):
+        data = {
+            "title": "budget",
+            "post_content": "budget",
+            "public_permission": "read",
+            "authenticated_permission": "read",
+            "team_permission": "read",
+            "author_permission": "edit",
+        }
+        self.measure('post_create', lambda role: (
+            'post', reverse('postCreateOrList'), data),
+            writer_statuses(status.HTTP_201_CREATED, anonymous=status.HTTP_401_UNAUTHORIZED))
+
+    def test_post_retrieve(self):
+        def request_for(role):
+            post = Post.objects.filter(read_level=AccessLevel.TEAM,
+                                       author=self.authors[0]).last()
+            return 'get', reverse('postRetrieveUpdateDestroy', kwargs={'pk': post.id}), None
+
+        # a 'team' post of the team of 'same_team', hidden from the other users
+        self.measure('post_retrieve', request_for, {
+            'anonymous': status.HTTP_404_NOT_FOUND,
+            'authenticated': status.HTTP_404_NOT_FOUND,
+            'same_team': status.HTTP_200_OK,
+            'staff': status.HTTP_200_OK,
+        })
+
+    def test_post_update(self):
+        def request_for(role):
+            post = self.public_post(author=self.users.get(role, self.authors[0]))
+            return 'patch', reverse('postRetrieveUpdateDestroy', kwargs={'pk': post.id}), {'title': 'patched'}
+
+        # anonymous users edit no post, it is not found among the editable ones
+        self.measure('post_update', request_for,
+                     writer_statuses(status.HTTP_200_OK, anonymous=status.HTTP_404_NOT_FOUND))
+
+    def test_post_engagement(self):
+        def request_for(role):
+            ids = Post.objects.order_by('-id').values_list('id', flat=True)[:10]
+            return 'get', reverse('postEngagement') + '?ids=' + ','.join(map(str, ids)), None
+
+        self.measure('post_engagement', request_for, status.HTTP_200_OK)
+
+    # ------------------------------  likes  -------------------------------#
+
+    def test_like_list(self):
+        self.measure('like_list', lambda role: (
+            'get', reverse('likesList'), None), status.HTTP_200_OK)
+
+    def test_like_create(self):
+        def request_for(role):
+            user = self.users.get(role)
+            data = {'post_id': self.public_post().id,
+                    'author': user.id if user else None}
+            return 'post', reverse('likesCreate'), data
+
+        self.measure('like_create', request_for, writer_statuses(status.HTTP_201_CREATED))
+
+    def test_like_destroy(self):
+        def request_for(role):
+            user = self.users.get(role, self.authors[0])
+            like = Like.objects.create(post_id=self.public_post(), author=user)
+            return 'delete', reverse('likesDestroy', kwargs={'post_id': like.post_id_id, 'author': user.id}), None
+
+        self.measure('like_destroy', request_for, writer_statuses(status.HTTP_204_NO_CONTENT))
+
+    def test_like_toggle(self):
+        self.measure('like_toggle', lambda role: (
+            'put', reverse('likesToggle', kwargs={'post_id': self.public_post().id}), None),
+            writer_statuses(status.HTTP_200_OK))
+
+    # -----------------------------  comments  -----------------------------#
+
+    def test_comment_list(self):
+        self.measure('comment_list', lambda role: (
+            'get', reverse('commentsList'), None), status.HTTP_200_OK)
+
+    def test_comment_create(self):
+        def request_for(role):
+            user = self.users.get(role)
+            data = {'post_id': self.public_post().id,
+                    'author': user.id if user else None,
+                    'comment_content': 'budget'}
+            return 'post', reverse('commentsCreate'), data
+
+        self.measure('comment_create', request_for, writer_statuses(status.HTTP_201_CREATED))
+
+    def test_comment_destroy(self):
+        def request_for(role):
+            user = self.users.get(role, self.authors[0])
+            comment = Comment.objects.create(post_id=self.public_post(), author=user,
+                                             comment_content='budget')
+            return 'delete', reverse('commentsDestroy', kwargs={'pk': comment.id}), None
+
+        self.measure('comment_destroy', request_for, writer_statuses(status.HTTP_204_NO_CONTENT))
+
+
+#####################   ASYNC LIST TESTS  #####################
+
+# (sync view, async view) of the lists of likes and comments: same filters,
+# same pages, the rows listed are the ones of the posts the user can read
+RELATED_LISTS = [('likesList', 'likesListAsync'), ('commentsList', 'commentsListAsync')]
+
+
+class AsyncListTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        post_list_cache.clear()
+        self.public = PostFactory(permission='public')
+        self.private = PostFactory(permission='author')
+        for post in [self.public, self.private]:
+            LikeFactory.create_batch(2, post_id=post)
+            CommentFactory.create_batch(2, post_id=post)
+        self.staff = CustomUserFactory(is_staff=True)
+        self.staff.set_password('secret')
+        self.staff.save()
+
+    def get_both(self, sync_name, async_name, query='', **headers):
+        sync, async_ = [self.client.get(reverse(name) + query, **headers) for name in (sync_name, async_name)]
+        self.assertEqual(async_.status_code, sync.status_code, f'{async_name}{query}')
+        # same body but the links
+        self.assertEqual(async_.content.decode().replace(reverse(async_name), reverse(sync_name)),
+                         sync.content.decode(), f'{async_name}{query}')
+        return async_
+
+    def basic_auth(self, password):
+        credentials = b64encode(f'{self.staff.email}:{password}'.encode()).decode()
+        return {'HTTP_AUTHORIZATION': f'Basic {credentials}'}
+
+    def test_async_lists_match_the_sync_views(self):
+        for sync_name, async_name in RELATED_LISTS:
+            self.client.logout()
+            response = self.get_both(sync_name, async_name)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual({item['post_id'] for item in response.json()['results']}, {self.public.id})
+
+            self.client.force_login(self.staff)
+            self.assertEqual(self.get_both(sync_name, async_name).json()['count'], 4)
+            self.assertEqual(self.get_both(sync_name, async_name, f'?post_id={self.private.id}')
+                             .json()['count'], 2)
+
+    def test_async_lists_reject_unknown_filter_values(self):
+        for sync_name, async_name in RELATED_LISTS:
+            response = self.get_both(sync_name, async_name, '?post_id=999999')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_basic_auth_is_accepted_like_on_the_sync_views(self):
+        for sync_name, async_name in RELATED_LISTS + [('postCreateOrList', 'postListAsync')]:
+            response = self.get_both(sync_name, async_name, **self.basic_auth('secret'))
+            # the staff user reads the private post too
+            self.assertEqual(response.json()['count'], 2 if sync_name == 'postCreateOrList' else 4)
+
+            response = self.get_both(sync_name, async_name, **self.basic_auth('wrong'))
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+#####################   READ REPLICA TESTS  #####################
+
+class ReplicaRouterTests(SimpleTestCase):
+
+    router = ReplicaRouter()
+
+    def in_replica_context(self, test):
+        token = _read_from_replica.set(True)
+        try:
+            return test()
+        finally:
+            _read_from_replica.reset(token)
+
+    @override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+    def test_only_reads_of_routed_requests_use_a_replica(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertIn(self.in_replica_context(lambda: self.router.db_for_read(Post)),
+                      ['replica1', 'replica2'])
+        self.assertEqual(self.in_replica_context(lambda: self.router.db_for_write(Post)), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_the_primary(self):
+        self.assertEqual(self.in_replica_context(lambda: self.router.db_for_read(Post)), 'default')
+
+    def test_middleware_routes_safe_methods_and_pins_writers(self):
+        seen = []
+
+        def view(request):
+            seen.append(_read_from_replica.get())
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        factory = RequestFactory()
+
+        response = middleware(factory.get('/post/'))
+        self.assertNotIn(ReplicaRoutingMiddleware.pin_cookie_name, response.cookies)
+
+        response = middleware(factory.post('/post/'))
+        cookie = response.cookies[ReplicaRoutingMiddleware.pin_cookie_name]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+
+        pinned = factory.get('/post/')
+        pinned.COOKIES[ReplicaRoutingMiddleware.pin_cookie_name] = '1'
+        middleware(pinned)
+
+        self.assertEqual(seen, [True, False, False])
+        self.assertFalse(_read_from_replica.get())
+
+    async def test_middleware_keeps_async_views_async(self):
+        seen = []
+
+        async def view(request):
+            seen.append(_read_from_replica.get())
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        response = await middleware(RequestFactory().post('/post/'))
+        await middleware(RequestFactory().get('/post/'))
+
+        self.assertIn(ReplicaRoutingMiddleware.pin_cookie_name, response.cookies)
+        self.assertEqual(seen, [False, True])
+
+
+@override_settings(DATABASE_REPLICAS=['replica_test'])
+class ReplicaReadYourWritesTests(TransactionTestCase):
+    # a second SQLite file stands in for the replica, sync_replicas for replication.
+    # The alias is only registered for these tests, configured replicas mirror
+    # the test database
+    serialized_rollback = True
+
+    def setUp(self):
+        cache.clear()
+        post_list_cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        connections.settings['replica_test'] = dict(
+            connections['default'].settings_dict,
+            NAME=os.path.join(self.directory.name, 'replica.sqlite3'))
+
+        self.user = CustomUserFactory()
+        PostFactory(permission='public', author=self.user)
+        call_command('sync_replicas', stdout=io.StringIO())
+        PostFactory(permission='public', author=self.user)
+
+    def tearDown(self):
+        connections['replica_test'].close()
+        del connections['replica_test']
+        del connections.settings['replica_test']
+        self.directory.cleanup()
+
+    def count(self, client):
+        return client.get(reverse('postCreateOrList') + '?count=exact').data['count']
+
+    def test_reads_follow_the_replica_until_the_client_writes(self):
+        writer, reader = APIClient(), APIClient()
+        self.assertEqual(self.count(writer), 1)
+
+        writer.force_authenticate(user=self.user)
+        response = writer.patch(reverse('postRetrieveUpdateDestroy', kwargs={'pk': Post.objects.first().id}),
+                                {'title': 'edited'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        # the writer is pinned to the primary, the other clients keep reading the replica
+        self.assertEqual(self.count(writer), 2)
+        self.assertEqual(self.count(reader), 1)
+
+        call_command('sync_replicas', stdout=io.StringIO())
+        self.assertEqual(self.count(reader), 2)
+
+
+#####################   SQLITE TUNING TESTS  #####################
+
+class SqliteBackendTests(SimpleTestCase):
+    # connections to a file of their own, the test database lives in memory
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.connections = []
+
+    def tearDown(self):
+        for wrapper in self.connections:
+            wrapper.close()
+        self.directory.cleanup()
+
+    def connect(self, **options):
+        wrapper = DatabaseWrapper(dict(
+            connections['default'].settings_dict,
+            NAME=os.path.join(self.directory.name, 'tuned.sqlite3'),
+            OPTIONS=dict(settings.SQLITE_OPTIONS, **options)))
+        wrapper.ensure_connection()
+        self.connections.append(wrapper)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        return wrapper.connection.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def test_new_connections_run_the_pragmas(self):
+        wrapper = self.connect()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(wrapper, 'temp_store'), 2)  # MEMORY
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), settings.SQLITE_PRAGMAS['cache_size'])
+        self.assertEqual(self.pragma(wrapper, 'foreign_keys'), 1)
+
+    def test_transactions_take_the_write_lock_when_they_begin(self):
+        writer = self.connect()
+        other = self.connect(timeout=0)
+
+        writer._start_transaction_under_autocommit()
+        try:
+            with self.assertRaisesMessage(OperationalError, 'database is locked'):
+                other._start_transaction_under_autocommit()
+        finally:
+            writer.connection.execute('ROLLBACK')
+
+    def test_unknown_transaction_mode_is_rejected(self):
+        wrapper = self.connect(transaction_mode='LAZY')
+        with self.assertRaises(ImproperlyConfigured):
+            wrapper._start_transaction_under_autocommit()
+
+
+@override_settings(SQLITE_WRITE_RETRIES=3, SQLITE_WRITE_BACKOFF=0)
+class RunWriteTests(SimpleTestCase):
+
+    def failing(self, message, failures):
+        calls = []
+
+        def write():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return 'written'
+        return write, calls
+
+    def test_locked_writes_are_retried(self):
+        write, calls = self.failing('database is locked', failures=2)
+        self.assertEqual(run_write(write), 'written')
+        self.assertEqual(len(calls), 3)
+
+    def test_gives_up_after_the_retries(self):
+        write, calls = self.failing('database is locked', failures=10)
+        with self.assertRaises(OperationalError):
+            run_write(write)
+        self.assertEqual(len(calls), settings.SQLITE_WRITE_RETRIES + 1)
+
+    def test_other_errors_are_not_retried(self):
+        write, calls = self.failing('no such table: posts_post', failures=1)
+        with self.assertRaises(OperationalError):
+            run_write(write)
+        self.assertEqual(len(calls), 1)
+
+    def test_write_queue_serializes_writers(self):
+        running, overlaps = [], []
+
+        def write():
+            running.append(1)
+            overlaps.append(len(running))
+            time.sleep(0.01)
+            running.pop()
+
+        threads = [threading.Thread(target=run_write, args=(write,), kwargs={'serialize': True})
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(overlaps, [1, 1, 1, 1])
+
+
+@override_settings(SQLITE_WRITE_BACKOFF=0)
+class RunWriteInTransactionTests(TestCase):
+
+    def test_locked_writes_are_not_retried_inside_a_transaction(self):
+        calls = []
+
+        def write():
+            calls.append(1)
+            raise OperationalError('database is locked')
+
+        # every TestCase runs in a transaction
+        with self.assertRaises(OperationalError):
+            run_write(write)
+        self.assertEqual(len(calls), 1)
+
+
+class BenchmarkSqliteCommandTests(SimpleTestCase):
+
+    def test_reports_reader_and_writer_throughput_of_each_mode(self):
+        stdout = io.StringIO()
+        call_command('benchmark_sqlite', readers=1, writers=2, seconds=0.2, posts=10,
+                     modes='stock,tuned', stdout=stdout)
+        report = json.loads(stdout.getvalue())
+
+        self.assertEqual(list(report['results']), ['stock', 'tuned'])
+        tuned = report['results']['tuned']
+        self.assertGreater(tuned['read']['operations'], 0)
+        self.assertGreater(tuned['write']['operations'], 0)
+        self.assertEqual(tuned['write']['errors'], 0)
+        self.assertNotIn('benchmark_tuned', connections.settings)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_sqlite', modes='fastest', stdout=io.StringIO())
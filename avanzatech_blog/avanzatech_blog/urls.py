@@ -55,4 +55,7 @@ urlpatterns = [
     # LIKES app
     path('likes/', include('likes.urls')),
 
+    # FEED app
+    path('feed/', include('feed.urls')),
+
 ]
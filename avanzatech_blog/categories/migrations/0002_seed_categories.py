@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+CATEGORIES = ['public', 'authenticated', 'team', 'author']
+
+
+def seed_categories(apps, schema_editor):
+    Categories = apps.get_model('categories', 'Categories')
+    for name in CATEGORIES:
+        Categories.objects.get_or_create(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_categories, migrations.RunPython.noop),
+    ]
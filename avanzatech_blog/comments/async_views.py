@@ -0,0 +1,16 @@
+from posts.async_views import afilter_queryset, async_read_view, json_response, paginated_response
+from posts.policy import policy_for
+
+from .models import Comment
+from .pagination import CommentPagination
+from .serializers import CommentSerializer
+from .views import CommentList
+
+
+@async_read_view
+async def comment_list(request):
+    """Async CommentList: `/comments/list/async/`, see posts.async_views."""
+    # comments are visible when their post is
+    queryset = await afilter_queryset(
+        request, policy_for(request).filter_related(Comment.objects.all()), CommentList)
+    return json_response(await paginated_response(CommentPagination(), queryset, request, CommentSerializer))
@@ -1,7 +1,8 @@
-from rest_framework.pagination import PageNumberPagination
+from posts.pagination import CachedCountPagination
 
 
-class CommentPagination(PageNumberPagination):
+class CommentPagination(CachedCountPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 10
+    count_cache_prefix = 'comments-count'
@@ -1,9 +1,13 @@
 from rest_framework import serializers
+from posts.models import Post
 from comments.models import Comment
 
 
 class CommentSerializer(serializers.ModelSerializer):
     description = serializers.SerializerMethodField
+    # author is needed by the access policy to check 'team' posts
+    post_id = serializers.PrimaryKeyRelatedField(
+        queryset=Post.objects.select_related('author'))
 
     class Meta:
         model = Comment
@@ -1,11 +1,13 @@
 from django.urls import path
 
+from .async_views import comment_list
 from .views import CommentCreate, CommentList, CommentDestroy
 
 
 urlpatterns = [
     path('', CommentCreate.as_view(), name='commentsCreate'),
     path('list/', CommentList.as_view(), name='commentsList'),
+    path('list/async/', comment_list, name='commentsListAsync'),
     path('<int:pk>/', CommentDestroy.as_view(),
          name='commentsDestroy'),
 
@@ -9,8 +9,12 @@ from rest_framework.generics import CreateAPIView, ListAPIView, DestroyAPIView
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework import status
-from posts.models import Post
+from posts.models import Post, PostScore
+from posts import scores
+from posts.policy import policy_for
 from django.db.models import Q
+from django.db import transaction
+from avanzatech_blog.sqlite.writes import retrying_write
 from rest_framework.exceptions import NotFound, PermissionDenied
 from django_filters.rest_framework import DjangoFilterBackend
 
@@ -25,27 +29,36 @@ class CommentCreate(CreateAPIView):
     def get_queryset(self):
         return Comment.objects.all()
 
+    @retrying_write
     def create(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return Response({'error': 'Authentication required for commenting on a post.'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        serializer = CommentSerializer(data=request.data)
+        serializer = self.get_serializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         if request.data['author'] != request.user.id:
             return Response({'error': 'Author commenting must be the same as request.user.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        user_requester = self.request.user
-        post_instance = Post.objects.get(pk=request.data["post_id"])
-        permission = post_instance.permission
+        # the post was already loaded (with its author) while validating post_id
+        post_instance = serializer.validated_data['post_id']
 
 # checking for view access to the post
-        if user_requester.is_staff or permission in ['public', 'authenticated'] or (permission == 'team' and user_requester.team_id == post_instance.author.team_id) or user_requester.id == post_instance.author.id:
-            return super().create(request, *args, **kwargs)
+        if policy_for(request).can_read(post_instance):
+            self.perform_create(serializer)
+            headers = self.get_success_headers(serializer.data)
+            return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
         return Response({'error': 'You dont comply with permissions needed to like a post.'}, status=status.HTTP_401_UNAUTHORIZED)
 
+    def perform_create(self, serializer):
+        # the comment and the post counter are written in one transaction
+        with transaction.atomic():
+            comment = serializer.save()
+            Post.add_to_counts(comment.post_id_id, comment_count=1)
+            PostScore.record([comment.post_id_id], scores.COMMENT_WEIGHT)
+
 
 class CommentList(ListAPIView):
 
@@ -58,20 +71,8 @@ class CommentList(ListAPIView):
 
     def get_queryset(self):
 
-        queryset = Comment.objects.all()
-
-        user = self.request.user
-        if user.is_anonymous:
-            return queryset.filter(post_id__permission='public')
-
-        elif user.is_authenticated and not user.is_staff:
-            return queryset.filter(
-                Q(post_id__permission__in=['public', 'authenticated']) |
-                Q(post_id__permission='team', post_id__author__team_id=user.team_id) |
-                Q(post_id__permission='author', post_id__author_id=user.id))
-
-        elif user.is_staff:
-            return queryset
+        # comments are visible when their post is
+        return policy_for(self.request).filter_related(Comment.objects.all())
 
 
 class CommentDestroy(DestroyAPIView):
@@ -80,37 +81,30 @@ class CommentDestroy(DestroyAPIView):
 
     queryset = Comment.objects.all()
 
-    def get_queryset(self):
-        user_requester = self.request.user
-        comment_id = self.kwargs['pk']
-
-        try:
-            comment_instance = Comment.objects.get(pk=comment_id)
-            comment_author = comment_instance.author
-        except Comment.DoesNotExist:
-            raise NotFound
-
-
-# if the user is staff or the author of the comment
-        if user_requester.is_staff or user_requester.id == comment_author.id:
-            return Comment.objects.filter(pk=comment_id)
-
-        if not comment_author == user_requester.id:
-            raise PermissionDenied('Users can only delete their own like')
-
-        raise NotFound
-
     def get_object(self):
-        queryset = self.filter_queryset(self.get_queryset())
-
-        # Get the comment_id from the URL kwargs
-        comment_id = self.kwargs['pk']
-
-        # Perform the lookup using comment_id
-        obj = queryset.filter(id=comment_id)
-
-        if obj is None:
+        # the comment is read once and deleted as an instance, so that its
+        # post is known when the counter is decremented
+        comment = Comment.objects.filter(pk=self.kwargs['pk']).first()
+        if comment is None:
             raise NotFound("No comment found with the given pk.")
 
-        self.check_object_permissions(self.request, obj)
-        return obj
+# if the user is staff or the author of the comment
+        user_requester = self.request.user
+        if not (user_requester.is_staff or user_requester.id == comment.author_id):
+            raise PermissionDenied('Users can only delete their own comment')
+
+        self.check_object_permissions(self.request, comment)
+        return comment
+
+    @retrying_write
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            _, deleted = instance.delete()
+            deleted = deleted.get(Comment._meta.label, 0)
+            Post.add_to_counts(instance.post_id_id, comment_count=-deleted)
+            # takes back what the comment added when it was made
+            PostScore.record([instance.post_id_id], -scores.COMMENT_WEIGHT * deleted,
+                             at=instance.created_at)
@@ -0,0 +1,12 @@
+from django.contrib import admin
+from .models import FeedEntry
+
+# Register your models here.
+
+
+class FeedEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'post_id', 'team_id', 'user_id', 'created_at')
+    readonly_fields = ('id', 'post_id', 'team_id', 'user_id', 'created_at')
+
+
+admin.site.register(FeedEntry, FeedEntryAdmin)
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:55
+
+from django.db import migrations
+
+# AccessLevel.TEAM and AccessLevel.AUTHOR
+TEAM, AUTHOR = 2, 3
+
+
+def backfill_entries(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    FeedEntry = apps.get_model('feed', 'FeedEntry')
+
+    rows = Post.objects.filter(read_level__in=(TEAM, AUTHOR)).values_list(
+        'id', 'read_level', 'created_at', 'author_id', 'author__team_id_id')
+    FeedEntry.objects.bulk_create((
+        FeedEntry(post_id_id=post_id, created_at=created_at,
+                  **({'team_id_id': team_id} if read_level == TEAM else {'user_id_id': author_id}))
+        for post_id, read_level, created_at, author_id, team_id in rows.iterator(chunk_size=2000)),
+        batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_entries, migrations.RunPython.noop),
+    ]
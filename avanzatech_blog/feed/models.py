@@ -0,0 +1,83 @@
+from django.db import models
+from django.db.models import Q
+
+from posts.models import AccessLevel, Post
+from teams.models import Team
+from user.models import CustomUser
+
+# Create your models here.
+
+
+class FeedEntry(models.Model):
+    """
+    A post pushed to a home feed when it is written (fan-out on write):
+    'team' posts to the feed of the author's team, 'author' posts to the feed
+    of the author. 'public' and 'authenticated' posts are read by every user,
+    they are pulled from the post table instead (see feed.reader), so a post
+    costs at most one entry whatever the size of its audience.
+    """
+    post_id = models.ForeignKey(Post, on_delete=models.CASCADE)
+    team_id = models.ForeignKey(Team, null=True, blank=True, on_delete=models.CASCADE)
+    user_id = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.CASCADE)
+    # copied from the post, feeds are walked newest first by (created_at, post)
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        owner = f"team {self.team_id_id}" if self.team_id_id else f"user {self.user_id_id}"
+        return f"Post {self.post_id_id} in the feed of {owner}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['team_id', 'created_at', 'post_id'],
+                         name='feed_team_created_post_idx'),
+            models.Index(fields=['user_id', 'created_at', 'post_id'],
+                         name='feed_user_created_post_idx'),
+        ]
+        constraints = [
+            # an entry belongs to exactly one feed
+            models.CheckConstraint(
+                check=Q(team_id__isnull=False, user_id__isnull=True) |
+                Q(team_id__isnull=True, user_id__isnull=False),
+                name='feed_entry_one_owner'),
+        ]
+
+    @classmethod
+    def entries_for(cls, posts):
+        """Unsaved entries of saved posts, ready for bulk_create."""
+        pushed = [post for post in posts if post.read_level in (AccessLevel.TEAM, AccessLevel.AUTHOR)]
+        # teams of the authors that are not loaded on the posts, in one query
+        missing = {post.author_id for post in pushed
+                   if post.read_level == AccessLevel.TEAM and not Post.author.is_cached(post)}
+        teams = dict(CustomUser.objects.filter(id__in=missing).values_list('id', 'team_id')) if missing else {}
+
+        entries = []
+        for post in pushed:
+            if post.read_level == AccessLevel.AUTHOR:
+                entries.append(cls(post_id=post, user_id_id=post.author_id, created_at=post.created_at))
+                continue
+            team_id = post.author.team_id_id if Post.author.is_cached(post) else teams.get(post.author_id)
+            if team_id is not None:
+                entries.append(cls(post_id=post, team_id_id=team_id, created_at=post.created_at))
+        return entries
+
+    @classmethod
+    def fan_out(cls, posts):
+        """Push newly created posts to their feeds: one bulk INSERT at most."""
+        entries = cls.entries_for(posts)
+        if entries:
+            cls.objects.bulk_create(entries)
+        return entries
+
+    @classmethod
+    def refresh(cls, post_ids):
+        """Replace the entries of existing posts, after their read_level changed."""
+        posts = list(Post.objects.filter(id__in=post_ids).select_related('author')
+                     .only('id', 'read_level', 'created_at', 'author__team_id'))
+        cls.objects.filter(post_id__in=post_ids).delete()
+        return cls.fan_out(posts)
+
+    @classmethod
+    def move_team_posts(cls, author):
+        """Move the 'team' posts of `author` to the feed of their current team."""
+        return (cls.objects.filter(post_id__author=author, team_id__isnull=False)
+                .exclude(team_id=author.team_id_id).update(team_id=author.team_id_id))
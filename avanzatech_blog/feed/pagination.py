@@ -0,0 +1,36 @@
+from rest_framework.utils.urls import replace_query_param
+
+from posts.pagination import PostKeysetPagination, encode_position
+from posts.policy import policy_for
+
+from .reader import feed_positions
+
+
+class FeedPagination(PostKeysetPagination):
+    """
+    PostKeysetPagination over a home feed: the page is merged from the feed
+    sources of the user (see feed.reader), then its posts are read by id.
+    Cursors and responses are the ones of the post list cursor mode.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_page_size(request)
+        # one extra position tells whether there is a next page
+        positions = feed_positions(request.user, self.decode_cursor(request), self.limit + 1)
+        self.has_next = len(positions) > self.limit
+        positions = positions[:self.limit]
+        self.last_position = positions[-1] if positions else None
+        # the entries are checked against the access policy of the reader:
+        # they are written ahead of time and a post can become unreadable since
+        posts = policy_for(request).filter_posts(queryset).in_bulk([pk for _, pk in positions])
+        self.page = [posts[pk] for _, pk in positions if pk in posts]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        # the next page starts after the last position, the post there may
+        # have been left out of the page
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encode_position(*self.last_position))
@@ -0,0 +1,49 @@
+from heapq import merge
+
+from django.db.models import Q
+
+from posts.models import AccessLevel, Post
+
+from .models import FeedEntry
+
+
+# A home feed merges the posts pushed to the reader (the FeedEntry rows of
+# their team and of themselves) with the posts pulled from the post table
+# ('public' and 'authenticated' ones). Each source is a range scan of at
+# most `limit` rows on its own index, newest first.
+
+
+def before(queryset, position, id_field):
+    """Rows of `queryset` older than the (created_at, id) `position`, newest first."""
+    if position is not None:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, **{f'{id_field}__lt': pk}))
+    return queryset.order_by('-created_at', f'-{id_field}')
+
+
+def feed_sources(user):
+    """(queryset, post id field) of every source of the feed of `user`."""
+    if user.is_staff:
+        # staff read every post, there is nothing to merge
+        return [(Post.objects.all(), 'id')]
+    return [
+        (Post.objects.filter(read_level__lte=AccessLevel.AUTHENTICATED), 'id'),
+        (FeedEntry.objects.filter(team_id=user.team_id_id), 'post_id'),
+        (FeedEntry.objects.filter(user_id=user.id), 'post_id'),
+    ]
+
+
+def feed_positions(user, position=None, limit=10):
+    """
+    The (created_at, post id) of the `limit` newest posts of the feed of
+    `user` older than `position`, newest first.
+    """
+    pages = [list(before(queryset, position, id_field).values_list('created_at', id_field)[:limit])
+             for queryset, id_field in feed_sources(user)]
+    positions, seen = [], set()
+    for created_at, pk in merge(*pages, reverse=True):
+        if pk not in seen:
+            seen.add(pk)
+            positions.append((created_at, pk))
+    return positions[:limit]
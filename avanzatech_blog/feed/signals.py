@@ -0,0 +1,44 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from postCategoryPermission.models import postCategoryPermission
+from posts.models import Post
+from user.models import CustomUser
+
+from .models import FeedEntry
+
+
+# fan out posts to the feeds when they are created and when their read_level
+# changes. These receivers run after the postCategoryPermission ones (the app
+# is installed after it), so read_level is already synced. Bulk writes skip
+# the signals and call FeedEntry.fan_out / FeedEntry.refresh themselves.
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        FeedEntry.fan_out([instance])
+
+
+@receiver(post_save, sender=postCategoryPermission)
+def refresh_feed_on_permission_save(sender, instance, **kwargs):
+    FeedEntry.refresh([instance.post_id_id])
+
+
+@receiver(post_delete, sender=postCategoryPermission)
+def refresh_feed_on_permission_delete(sender, instance, origin=None, **kwargs):
+    # only deletions of the pivot rows themselves: when they go with their
+    # post (or its author), new entries would point to a deleted post
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model is postCategoryPermission:
+        FeedEntry.refresh([instance.post_id_id])
+
+
+@receiver(post_save, sender=CustomUser)
+def move_feed_on_team_change(sender, instance, created, update_fields=None, **kwargs):
+    # entries hold the team of the author when the post was pushed, 'team'
+    # posts follow their author to a new team. Saves of other fields only
+    # (e.g. last_login on login) are skipped
+    if created or (update_fields is not None and 'team_id' not in update_fields):
+        return
+    FeedEntry.move_team_posts(instance)
@@ -0,0 +1,189 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from categories.models import Categories
+from permissions.models import Permissions
+from postCategoryPermission.models import postCategoryPermission
+from posts.factories import PostFactory
+from posts.models import AccessLevel, Post
+from posts.policy import PostAccessPolicy
+from teams.factories import TeamFactory
+from user.factories import CustomUserFactory
+from user.models import CustomUser
+
+from .models import FeedEntry
+
+# Create your tests here.
+
+
+class FeedFanOutTests(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUserFactory()
+        self.client.force_authenticate(user=self.user)
+
+    def post_data(self, title, public='none', authenticated='none', team='none'):
+        return {
+            "title": title,
+            "post_content": f'{title} content',
+            "public_permission": public,
+            "authenticated_permission": authenticated,
+            "team_permission": team,
+            "author_permission": "edit",
+        }
+
+    def entries(self):
+        return set(FeedEntry.objects.values_list('post_id', 'team_id', 'user_id'))
+
+    def test_create_pushes_team_and_author_posts_only(self):
+        url = reverse('postCreateOrList')
+
+        team_post = self.client.post(url, self.post_data('team', team='read'), format='json').data
+        author_post = self.client.post(url, self.post_data('author'), format='json').data
+        self.client.post(url, self.post_data('public', public='read'), format='json')
+        self.client.post(url, self.post_data('authenticated', authenticated='read'), format='json')
+
+        self.assertEqual(self.entries(), {
+            (team_post['id'], self.user.team_id_id, None),
+            (author_post['id'], None, self.user.id),
+        })
+
+    def test_batch_create_fans_out_in_one_insert(self):
+        url = reverse('postCreateOrList')
+        data = [self.post_data(f'team {i}', team='read') for i in range(3)]
+        data.append(self.post_data('public', public='read'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(FeedEntry.objects.filter(team_id=self.user.team_id).count(), 3)
+        inserts = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('INSERT')]
+        # posts, pivot rows, feed entries
+        self.assertEqual(len(inserts), 3)
+
+    def test_permission_change_moves_the_post_between_feeds(self):
+        post = PostFactory(author=self.user, permission='team')
+        self.assertEqual(self.entries(), {(post.id, self.user.team_id_id, None)})
+
+        # granting 'public' read makes it a pulled post
+        pivot = postCategoryPermission.objects.create(
+            post_id=post, category_id=Categories.objects.get(name='public'),
+            permission_id=Permissions.objects.get(name='read'))
+        self.assertEqual(self.entries(), set())
+
+        # without any grant left only the author reads it
+        pivot.delete()
+        self.assertEqual(self.entries(), {(post.id, None, self.user.id)})
+
+    def test_deleting_a_post_drops_its_entries(self):
+        post = PostFactory(author=self.user, permission='team')
+        postCategoryPermission.objects.create(
+            post_id=post, category_id=Categories.objects.get(name='team'),
+            permission_id=Permissions.objects.get(name='read'))
+
+        post.delete()
+
+        self.assertFalse(FeedEntry.objects.exists())
+
+
+class FeedListTests(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUserFactory()
+        teammate = CustomUserFactory(team_id=self.user.team_id)
+        outsider = CustomUserFactory()
+        for author in (self.user, teammate, outsider):
+            for permission in ('public', 'authenticated', 'team', 'author'):
+                PostFactory.create_batch(2, author=author, permission=permission)
+        self.client.force_authenticate(user=self.user)
+
+    def walk_pages(self, url):
+        pages = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append((response.data['results'], len(queries)))
+            url = response.data['next']
+        return pages
+
+    def readable_ids(self, user):
+        return list(PostAccessPolicy(user).filter_posts(Post.objects.all())
+                    .order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_feed_walks_the_readable_posts_newest_first(self):
+        pages = self.walk_pages(reverse('feedList') + '?page_size=3')
+
+        ids = [post['id'] for results, _ in pages for post in results]
+        # public and authenticated posts of everyone, the team posts of the
+        # team and the user's own author posts
+        self.assertEqual(len(ids), 2 * 6 + 2 * 2 + 2)
+        self.assertEqual(ids, self.readable_ids(self.user))
+
+    def test_every_page_costs_the_same_queries(self):
+        pages = self.walk_pages(reverse('feedList') + '?page_size=3')
+
+        # three bounded feed sources and the posts of the page
+        self.assertEqual({query_count for _, query_count in pages[:-1]}, {4})
+
+    def test_staff_feed_has_every_post(self):
+        admin = CustomUserFactory(is_staff=True)
+        self.client.force_authenticate(user=admin)
+
+        pages = self.walk_pages(reverse('feedList') + '?page_size=10')
+
+        ids = [post['id'] for results, _ in pages for post in results]
+        self.assertEqual(ids, list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_feed_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(reverse('feedList'))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('feedList') + '?cursor=nope')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_team_posts_follow_their_author_to_a_new_team(self):
+        teammate = CustomUserFactory(team_id=self.user.team_id)
+        post = PostFactory(author=teammate, permission='team')
+        ids = [item['id'] for results, _ in self.walk_pages(reverse('feedList')) for item in results]
+        self.assertIn(post.id, ids)
+
+        teammate.team_id = TeamFactory()
+        teammate.save()
+
+        ids = [item['id'] for results, _ in self.walk_pages(reverse('feedList')) for item in results]
+        self.assertNotIn(post.id, ids)
+        self.assertEqual(ids, self.readable_ids(self.user))
+        self.assertEqual(FeedEntry.objects.get(post_id=post).team_id, teammate.team_id)
+
+    def test_entries_of_unreadable_posts_are_left_out(self):
+        post = PostFactory(author=CustomUserFactory(team_id=self.user.team_id), permission='team')
+        # an entry the reader can no longer read, e.g. written before a change
+        # that skipped the signals
+        CustomUser.objects.filter(id=post.author_id).update(team_id=TeamFactory())
+
+        pages = self.walk_pages(reverse('feedList') + '?page_size=3')
+
+        ids = [item['id'] for results, _ in pages for item in results]
+        self.assertNotIn(post.id, ids)
+        self.assertEqual(ids, self.readable_ids(self.user))
+
+    def test_refresh_rebuilds_the_entries(self):
+        expected = set(FeedEntry.objects.values_list('post_id', 'team_id', 'user_id'))
+        FeedEntry.objects.all().delete()
+
+        FeedEntry.refresh(Post.objects.values_list('id', flat=True))
+
+        self.assertEqual(set(FeedEntry.objects.values_list('post_id', 'team_id', 'user_id')), expected)
+        self.assertEqual(FeedEntry.objects.count(), Post.objects.filter(
+            read_level__in=(AccessLevel.TEAM, AccessLevel.AUTHOR)).count())
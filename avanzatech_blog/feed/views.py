@@ -0,0 +1,27 @@
+from rest_framework.generics import ListAPIView
+from rest_framework.permissions import IsAuthenticated
+
+from posts.models import Post
+from posts.serializers import PostSerializerCreateList
+from posts.views import sparse_queryset
+
+from .pagination import FeedPagination
+
+# Create your views here.
+
+
+class FeedList(ListAPIView):
+    """
+    Home feed of the user, newest first: the posts of their team and their
+    own posts, pushed to the feed when they are written, merged with the
+    'public' and 'authenticated' posts. Cursor paginated like
+    `/post/?pagination=cursor`.
+    """
+    serializer_class = PostSerializerCreateList
+    pagination_class = FeedPagination
+    permission_classes = [IsAuthenticated]
+    # the feed is already restricted to the posts the user can read
+    filter_backends = ()
+
+    def get_queryset(self):
+        return sparse_queryset(Post.objects.all(), self.get_serializer_class(), self.request)
@@ -0,0 +1,16 @@
+from posts.async_views import afilter_queryset, async_read_view, json_response, paginated_response
+from posts.policy import policy_for
+
+from .models import Like
+from .pagination import LikePagination
+from .serializers import LikeSerializer
+from .views import LikeList
+
+
+@async_read_view
+async def like_list(request):
+    """Async LikeList: `/likes/async/`, see posts.async_views."""
+    # likes are visible when their post is
+    queryset = await afilter_queryset(
+        request, policy_for(request).filter_related(Like.objects.all()), LikeList)
+    return json_response(await paginated_response(LikePagination(), queryset, request, LikeSerializer))
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:13
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# posts.scores weights as of this migration, copied so later changes of them
+# don't change what it does
+LIKE_WEIGHT, COMMENT_WEIGHT = 1, 2
+
+
+def delete_duplicate_likes(apps, schema_editor):
+    """Keeps the first like of every (post, author), recounts the posts that had more."""
+    Like = apps.get_model('likes', 'Like')
+    Post = apps.get_model('posts', 'Post')
+    PostScore = apps.get_model('posts', 'PostScore')
+
+    duplicated = (Like.objects.values('post_id', 'author').order_by()
+                  .annotate(first_id=Min('id'), total=Count('id')).filter(total__gt=1))
+    post_ids = set()
+    for row in duplicated.iterator():
+        Like.objects.filter(post_id=row['post_id'], author=row['author'], id__gt=row['first_id']).delete()
+        post_ids.add(row['post_id'])
+    if not post_ids:
+        return
+
+    likes = Like.objects.filter(post_id=OuterRef('pk')).order_by().values('post_id').annotate(
+        total=Count('id')).values('total')
+    Post.objects.filter(id__in=post_ids).update(like_count=Coalesce(Subquery(likes), 0))
+    post = Post.objects.filter(id=OuterRef('post_id'))
+    PostScore.objects.filter(post_id__in=post_ids).update(score=Subquery(post.values(
+        total=F('like_count') * LIKE_WEIGHT + F('comment_count') * COMMENT_WEIGHT)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('likes', '0002_initial'),
+        ('posts', '0008_postscore'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('post_id', 'author'), name='like_unique_post_author'),
+        ),
+    ]
@@ -1,7 +1,9 @@
-
-from django.db import models
+from django.db import connection, models, transaction
 from user.models import CustomUser
-from posts.models import Post
+from posts.models import Post, PostScore
+from posts import scores
+from posts.signals import invalidate_cached_counts
+from avanzatech_blog.sqlite.writes import last_insert
 
 # Create your models here.
 
@@ -15,3 +17,56 @@ class Like(models.Model):
 
     def __str__(self):
         return f"Like made by {self.user_id}"
+
+    class Meta:
+        constraints = [
+            # a user likes a post once, whatever the concurrent requests
+            models.UniqueConstraint(fields=['post_id', 'author'], name='like_unique_post_author'),
+        ]
+
+    # like and unlike are idempotent: each one is a single statement that
+    # can't duplicate or miss a row, the post counter and score only move
+    # when a row was actually written. Both skip the save/delete signals and
+    # drop the cached lists themselves.
+
+    @classmethod
+    def add(cls, post_id, author_id):
+        """
+        Likes the post: INSERT ... ON CONFLICT DO NOTHING. Returns the new
+        like, None when the user already liked the post.
+        """
+        like = cls(post_id_id=post_id, author_id=author_id)
+        with transaction.atomic():
+            cls.objects.bulk_create([like], ignore_conflicts=True)
+            written, like.pk = last_insert()
+            if not written:
+                return None
+            Post.add_to_counts(post_id, like_count=1)
+            PostScore.record([post_id], scores.LIKE_WEIGHT, at=like.created_at)
+        invalidate_cached_counts(sender=cls)
+        return like
+
+    @classmethod
+    def remove(cls, post_id, author_id):
+        """
+        Unlikes the post with a single DELETE ... RETURNING created_at.
+        Returns whether there was a like.
+        """
+        with transaction.atomic():
+            # queryset.delete() would first SELECT the rows for the post_delete
+            # signal; the time of the like is read back by the DELETE itself so
+            # its trending weight is taken back along with its score
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {connection.ops.quote_name(cls._meta.db_table)} '
+                    'WHERE post_id_id = %s AND author_id = %s RETURNING created_at',
+                    [post_id, author_id])
+                liked_at = [connection.ops.convert_datetimefield_value(created_at, None, connection)
+                            for created_at, in cursor.fetchall()]
+            if not liked_at:
+                return False
+            Post.add_to_counts(post_id, like_count=-len(liked_at))
+            for at in liked_at:
+                PostScore.record([post_id], -scores.LIKE_WEIGHT, at=at)
+        invalidate_cached_counts(sender=cls)
+        return True
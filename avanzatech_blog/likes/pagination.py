@@ -1,7 +1,8 @@
-from rest_framework.pagination import PageNumberPagination
+from posts.pagination import CachedCountPagination
 
 
-class LikePagination(PageNumberPagination):
+class LikePagination(CachedCountPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 20
+    count_cache_prefix = 'likes-count'
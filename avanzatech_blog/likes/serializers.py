@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from posts.models import Post
 from likes.models import Like
 
 
@@ -13,6 +14,9 @@ from likes.models import Like
 
 class LikeSerializer(serializers.ModelSerializer):
     description = serializers.SerializerMethodField
+    # author is needed by the access policy to check 'team' posts
+    post_id = serializers.PrimaryKeyRelatedField(
+        queryset=Post.objects.select_related('author'))
 
     class Meta:
         model = Like
@@ -1,4 +1,6 @@
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 # Create your tests here.
 
@@ -13,7 +15,8 @@ from factory.django import DjangoModelFactory
 from .models import Like
 from .factories import LikeFactory
 
-from posts.models import Post
+from posts.models import Post, PostScore
+from posts import scores
 from posts.factories import PostFactory
 
 from teams.models import Team
@@ -764,3 +767,86 @@ class LikesAdminDestroyTests(APITestCase):
         self.assertEqual(Post.objects.count(), 1)
         self.assertEqual(Like.objects.count(), 0)
         self.assertEqual(CustomUser.objects.count(), 3)
+
+
+#####################   LIKE TOGGLE TESTS  #####################
+
+class LikeToggleTests(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUserFactory()
+        self.post = PostFactory(permission='public')
+        self.url = reverse('likesToggle', kwargs={'post_id': self.post.id})
+        self.client.force_authenticate(user=self.user)
+
+    def like_count(self):
+        self.post.refresh_from_db()
+        return self.post.like_count
+
+    def test_like_and_unlike_are_idempotent(self):
+        first, second = self.client.put(self.url), self.client.put(self.url)
+
+        self.assertEqual(first.data, {'post_id': self.post.id, 'liked': True, 'changed': True})
+        self.assertFalse(second.data['changed'])
+        self.assertEqual(Like.objects.filter(post_id=self.post, author=self.user).count(), 1)
+        self.assertEqual(self.like_count(), 1)
+        self.assertEqual(PostScore.objects.get(post_id=self.post).score, scores.LIKE_WEIGHT)
+
+        first, second = self.client.delete(self.url), self.client.delete(self.url)
+
+        self.assertEqual(first.data, {'post_id': self.post.id, 'liked': False, 'changed': True})
+        self.assertFalse(second.data['changed'])
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(self.like_count(), 0)
+        self.assertEqual(PostScore.objects.get(post_id=self.post).score, 0)
+
+    def test_like_and_unlike_are_one_statement_each(self):
+        def likes_statements(method):
+            with CaptureQueriesContext(connection) as queries:
+                getattr(self.client, method)(self.url)
+            return [query['sql'].split()[0] for query in queries.captured_queries
+                    if 'likes_like' in query['sql']]
+
+        self.assertEqual(likes_statements('put'), ['INSERT'])
+        self.assertEqual(likes_statements('put'), ['INSERT'])
+        self.assertEqual(likes_statements('delete'), ['DELETE'])
+
+    def test_unlike_takes_back_the_trending_weight(self):
+        for _ in range(5):
+            self.client.put(self.url)
+            self.client.delete(self.url)
+        self.client.put(self.url)
+
+        like = Like.objects.get(post_id=self.post, author=self.user)
+        ranking = PostScore.objects.get(post_id=self.post)
+        self.assertEqual(ranking.score, scores.LIKE_WEIGHT)
+        # the same as a single like, toggling doesn't pile up trending weight
+        self.assertAlmostEqual(ranking.trending, scores.trending_term(scores.LIKE_WEIGHT, like.created_at))
+
+    def test_duplicate_likes_are_rejected_by_the_database(self):
+        Like.objects.create(post_id=self.post, author=self.user)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Like.objects.create(post_id=self.post, author=self.user)
+
+    def test_like_create_answers_the_new_like(self):
+        response = self.client.post(reverse('likesCreate'),
+                                    {'post_id': self.post.id, 'author': self.user.id}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['id'], Like.objects.get().id)
+
+    def test_unreadable_post_is_not_found(self):
+        private = PostFactory(permission='author')
+
+        response = self.client.put(reverse('likesToggle', kwargs={'post_id': private.id}))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Like.objects.exists())
+
+    def test_toggle_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+
+        response = self.client.put(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
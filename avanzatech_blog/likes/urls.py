@@ -1,6 +1,7 @@
 from django.urls import path
 
-from .views import LikeCreate, LikeList, LikeDestroy
+from .async_views import like_list
+from .views import LikeCreate, LikeList, LikeDestroy, LikeToggle
 
 
 urlpatterns = [
@@ -8,4 +9,6 @@ urlpatterns = [
     path('', LikeList.as_view(), name='likesList'),
     path('<int:author>/<int:post_id>/',
          LikeDestroy.as_view(), name='likesDestroy'),
+    path('async/', like_list, name='likesListAsync'),
+    path('post/<int:post_id>/', LikeToggle.as_view(), name='likesToggle'),
 ]
@@ -8,14 +8,19 @@ from rest_framework.generics import CreateAPIView, ListAPIView,  DestroyAPIView
 from .pagination import LikePagination
 from .filters import ListLikesFilterCustom
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.exceptions import NotFound, PermissionDenied
 from rest_framework.permissions import SAFE_METHODS
 from django_filters.rest_framework import DjangoFilterBackend
-from posts.models import Post
+from posts.models import Post, PostScore
+from posts import scores
+from posts.policy import policy_for
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
+from django.db import transaction
+from avanzatech_blog.sqlite.writes import retrying_write
 
 
 class LikeCreate(CreateAPIView):
@@ -24,28 +29,40 @@ class LikeCreate(CreateAPIView):
     serializer_class = LikeSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @retrying_write
     def create(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return Response({'error': 'Authentication required for liking a post.'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        serializer = LikeSerializer(data=request.data)
+        serializer = self.get_serializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         if request.data['author'] != request.user.id:
             return Response({'error': 'Author must be the same as request.user.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        user_requester = self.request.user
-        post_instance = Post.objects.get(pk=request.data["post_id"])
-        permission = post_instance.permission
+        # the post was already loaded (with its author) while validating post_id
+        post_instance = serializer.validated_data['post_id']
+
+        if policy_for(request).can_read(post_instance):
+            like = self.perform_create(serializer)
+        elif Like.objects.filter(post_id=post_instance, author=request.user).exists():
+            # liked before the user lost access to the post
+            like = None
+        else:
+            return Response({'error': 'You dont comply with permissions needed to like a post.'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        if Like.objects.filter(post_id=request.data["post_id"], author=request.data["author"]).exists():
+        if like is None:
             return Response({'message': 'already liked'}, status=status.HTTP_204_NO_CONTENT)
 
-        if user_requester.is_staff or permission in ['public', 'authenticated'] or (permission == 'team' and user_requester.team_id == post_instance.author.team_id) or user_requester.id == post_instance.author.id:
-            return super().create(request, *args, **kwargs)
+        serializer.instance = like
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
-        return Response({'error': 'You dont comply with permissions needed to like a post.'}, status=status.HTTP_401_UNAUTHORIZED)
+    def perform_create(self, serializer):
+        # a single INSERT ... ON CONFLICT DO NOTHING, concurrent requests
+        # can't like twice. None when the post was already liked
+        return Like.add(serializer.validated_data['post_id'].id, self.request.user.id)
 
 
 class LikeList(ListAPIView):
@@ -59,21 +76,8 @@ class LikeList(ListAPIView):
 
     def get_queryset(self):
 
-        queryset = Like.objects.all()
-
-        user = self.request.user
-
-        if user.is_anonymous:
-            return queryset.filter(post_id__permission='public')
-
-        elif user.is_authenticated and not user.is_staff:
-            return queryset.filter(
-                Q(post_id__permission__in=['public', 'authenticated']) |
-                Q(post_id__permission='team', post_id__author__team_id=user.team_id) |
-                Q(post_id__permission='author', post_id__author_id=user.id))
-
-        elif user.is_staff:
-            return queryset
+        # likes are visible when their post is
+        return policy_for(self.request).filter_related(Like.objects.all())
 
 
 class LikeDestroy(DestroyAPIView):
@@ -111,3 +115,40 @@ class LikeDestroy(DestroyAPIView):
 
         self.check_object_permissions(self.request, obj)
         return obj
+
+    @retrying_write
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            _, deleted = instance.delete()
+            deleted = deleted.get(Like._meta.label, 0)
+            Post.add_to_counts(instance.post_id_id, like_count=-deleted)
+            # takes back what the like added when it was made
+            PostScore.record([instance.post_id_id], -scores.LIKE_WEIGHT * deleted,
+                             at=instance.created_at)
+
+
+class LikeToggle(APIView):
+    """
+    `/likes/post/<post_id>/`: PUT likes the post as the user, DELETE unlikes
+    it. Both are idempotent and a single statement (see Like.add and
+    Like.remove), `changed` tells whether the request changed anything.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @retrying_write
+    def put(self, request, post_id):
+        post = Post.objects.select_related('author').filter(pk=post_id).first()
+        # posts the user can't read answer 404
+        if post is None or not policy_for(request).can_read(post):
+            raise NotFound
+        return self.toggled(post_id, True, Like.add(post_id, request.user.id) is not None)
+
+    @retrying_write
+    def delete(self, request, post_id):
+        return self.toggled(post_id, False, Like.remove(post_id, request.user.id))
+
+    def toggled(self, post_id, liked, changed):
+        return Response({'post_id': post_id, 'liked': liked, 'changed': changed})
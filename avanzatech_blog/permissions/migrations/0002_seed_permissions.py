@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+# 'none' grants nothing, any other permission lets the category read the post
+PERMISSIONS = ['none', 'read', 'edit']
+
+
+def seed_permissions(apps, schema_editor):
+    Permissions = apps.get_model('permissions', 'Permissions')
+    for name in PERMISSIONS:
+        Permissions.objects.get_or_create(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('permissions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_permissions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from categories.models import Categories
+from permissions.models import Permissions
+
+
+# In-process cache of the Categories and Permissions lookup tables.
+# Both are tiny and almost never change, so they are loaded once per process
+# and dropped by the post_save/post_delete receivers in signals.py.
+# Other processes keep their copy until they restart or write the tables.
+
+_tables = {}
+
+
+def _load(model):
+    rows = _tables.get(model)
+    if rows is None:
+        rows = {row.name: row for row in model.objects.all()}
+        _tables[model] = rows
+    return rows
+
+
+def categories_by_name():
+    """{category name: Categories instance}"""
+    return _load(Categories)
+
+
+def permissions_by_name():
+    """{permission name: Permissions instance}"""
+    return _load(Permissions)
+
+
+def invalidate(model=None):
+    if model is None:
+        _tables.clear()
+    else:
+        _tables.pop(model, None)
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('categories', '0001_initial'),
+        ('permissions', '0001_initial'),
+        ('posts', '0003_post_read_level'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='postCategoryPermission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='categories.categories')),
+                ('permission_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='permissions.permissions')),
+                ('post_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='posts.post')),
+            ],
+        ),
+    ]
@@ -1,8 +1,8 @@
 from django.db import models
-
-from posts.models import Post
+from posts.models import Post, AccessLevel
 from categories.models import Categories
 from permissions.models import Permissions
+from . import lookups
 
 # Create your models here.
 
@@ -13,4 +13,28 @@ class postCategoryPermission(models.Model):
     permission_id = models.ForeignKey(Permissions, on_delete=models.CASCADE)
 
     def __str__(self):
-        return f"Pivoting post: {self.post_id} with category: {self.category_id} and permission: {self.permission_id}"
\ No newline at end of file
+        return f"Pivoting post: {self.post_id} with category: {self.category_id} and permission: {self.permission_id}"
+
+    @classmethod
+    def rows_for(cls, post, grants):
+        """Unsaved pivot rows for {category name: permission name}, ready for bulk_create."""
+        categories = lookups.categories_by_name()
+        permissions = lookups.permissions_by_name()
+        return [cls(post_id=post, category_id=categories[category_name], permission_id=permissions[permission_name])
+                for category_name, permission_name in grants.items()
+                if category_name in categories]
+
+    @classmethod
+    def sync_read_level(cls, post_id):
+        """Recompute Post.read_level from the pivot rows of the given post."""
+        # ids are turned into names through the cached lookup tables
+        category_names = {category.id: name for name, category
+                          in lookups.categories_by_name().items()}
+        permission_names = {permission.id: name for name, permission
+                            in lookups.permissions_by_name().items()}
+        grants = {category_names.get(category_id): permission_names.get(permission_id)
+                  for category_id, permission_id in cls.objects.filter(post_id=post_id).values_list(
+                      'category_id', 'permission_id')}
+        read_level = AccessLevel.from_grants(grants)
+        Post.objects.filter(pk=post_id).update(read_level=read_level)
+        return read_level
@@ -0,0 +1,32 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from categories.models import Categories
+from permissions.models import Permissions
+
+from . import lookups
+from .models import postCategoryPermission
+
+
+# keep the denormalized Post.read_level in sync with every pivot write.
+# bulk writes (bulk_create, queryset.update/delete) skip these signals and
+# must call postCategoryPermission.sync_read_level themselves.
+
+@receiver(post_save, sender=postCategoryPermission)
+def sync_read_level_on_save(sender, instance, **kwargs):
+    postCategoryPermission.sync_read_level(instance.post_id_id)
+
+
+@receiver(post_delete, sender=postCategoryPermission)
+def sync_read_level_on_delete(sender, instance, **kwargs):
+    postCategoryPermission.sync_read_level(instance.post_id_id)
+
+
+# drop the cached lookup tables whenever a category or permission changes
+
+@receiver(post_save, sender=Categories)
+@receiver(post_delete, sender=Categories)
+@receiver(post_save, sender=Permissions)
+@receiver(post_delete, sender=Permissions)
+def invalidate_lookup_tables(sender, **kwargs):
+    lookups.invalidate(sender)
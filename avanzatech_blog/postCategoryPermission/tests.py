@@ -1,3 +1,77 @@
 from django.test import TestCase
 
 # Create your tests here.
+
+from .models import postCategoryPermission
+from . import lookups
+
+from categories.models import Categories
+from permissions.models import Permissions
+
+from posts.models import Post, AccessLevel
+from posts.factories import PostFactory
+
+
+class PostReadLevelSyncTests(TestCase):
+
+    def setUp(self):
+        self.post = PostFactory()
+        self.read = Permissions.objects.get(name='read')
+        self.none = Permissions.objects.get(name='none')
+
+    def grant(self, category_name, permission):
+        return postCategoryPermission.objects.create(
+            post_id=self.post,
+            category_id=Categories.objects.get(name=category_name),
+            permission_id=permission)
+
+    def test_read_level_is_widest_category_with_access(self):
+        self.grant('public', self.none)
+        self.grant('authenticated', self.none)
+        self.grant('team', self.read)
+        self.grant('author', self.read)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.read_level, AccessLevel.TEAM)
+
+    def test_read_level_follows_pivot_updates(self):
+        public = self.grant('public', self.read)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.read_level, AccessLevel.PUBLIC)
+
+        public.permission_id = self.none
+        public.save()
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.read_level, AccessLevel.AUTHOR)
+
+    def test_read_level_falls_back_to_author_when_pivot_rows_are_deleted(self):
+        self.grant('authenticated', self.read).delete()
+
+        self.assertEqual(Post.objects.get(pk=self.post.pk).read_level,
+                         AccessLevel.AUTHOR)
+
+
+class LookupTablesCacheTests(TestCase):
+
+    def setUp(self):
+        lookups.invalidate()
+
+    def test_lookup_tables_are_loaded_once(self):
+        lookups.categories_by_name()
+        lookups.permissions_by_name()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(set(lookups.categories_by_name()),
+                             {'public', 'authenticated', 'team', 'author'})
+            self.assertIn('read', lookups.permissions_by_name())
+
+    def test_lookup_tables_are_invalidated_on_write(self):
+        self.assertNotIn('moderate', lookups.permissions_by_name())
+
+        permission = Permissions.objects.create(name='moderate')
+        self.assertIn('moderate', lookups.permissions_by_name())
+
+        permission.delete()
+        self.assertNotIn('moderate', lookups.permissions_by_name())
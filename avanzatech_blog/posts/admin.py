@@ -3,6 +3,7 @@
 
 from django.contrib import admin
 from .models import Post
+from .search import search_posts
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -13,6 +14,13 @@ class PostAdmin(admin.ModelAdmin):
     fieldsets = [
         ('Create new post', {'fields': ('title', 'post_content', 'author',)}),]
 
+    def get_search_results(self, request, queryset, search_term):
+        # search_fields only enables the search box, matching goes through
+        # the full-text index instead of LIKE '%term%' scans
+        if not search_term.strip():
+            return queryset, False
+        return search_posts(queryset, search_term), False
+
     # Create a post
     # add_fieldsets = (
     #     ("Create New Post", {
@@ -0,0 +1,144 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.http import require_safe
+from django_filters import utils as filter_utils
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from postCategoryPermission import lookups
+
+from .conditional import list_etag, not_modified, post_etag, set_etag
+from .models import Post
+from .pagination import PostKeysetPagination, PostPagination
+from .policy import policy_for
+from .response_cache import post_list_cache, post_list_key, response_size
+from .serializers import PostSerializerCreateList, PostSerializerRetrieveUpdateDestroy
+from .views import sparse_queryset
+
+
+# Async counterparts of the read endpoints, for ASGI servers: the database is
+# only reached through the async ORM (aiterator, aget, aaggregate...), so a
+# request waiting on it doesn't hold a thread and one worker serves many slow
+# clients. Access rules, pagination, caches and conditional GETs are the ones
+# of the DRF views, the responses are the same.
+
+
+def json_response(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), status=status,
+                        content_type='application/json')
+
+
+def async_read_view(view):
+    """
+    Decorator of the async read views: GET/HEAD only, `request` is a DRF
+    Request authenticated by the DEFAULT_AUTHENTICATION_CLASSES of the DRF
+    views (session or Basic credentials alike) and APIExceptions are answered
+    the way DRF does.
+    """
+    @require_safe
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        api_request = Request(request, authenticators=[
+            authentication() for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+        try:
+            # the authentication classes read the database synchronously
+            await sync_to_async(lambda: api_request.user)()
+            return await view(api_request, *args, **kwargs)
+        except APIException as exc:
+            return exception_response(api_request, exc)
+    return wrapper
+
+
+def exception_response(request, exc):
+    """The response of APIView.handle_exception() to `exc`."""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = json_response(data, status=exc.status_code)
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+        # WWW-Authenticate of the first authentication class, 403 without one
+        header = request.authenticators[0].authenticate_header(request) if request.authenticators else None
+        if header:
+            response['WWW-Authenticate'] = header
+        else:
+            response.status_code = 403
+    return response
+
+
+async def afilter_queryset(request, queryset, view_class):
+    """
+    The DjangoFilterBackend filters of `view_class` (filterset_fields), its
+    choice fields are validated against the database in a thread.
+    """
+    filterset = DjangoFilterBackend().get_filterset(request, queryset, view_class())
+    if filterset is None:
+        return queryset
+    if not await sync_to_async(filterset.is_valid)():
+        raise filter_utils.translate_validation(filterset.errors)
+    return filterset.qs
+
+
+async def paginated_response(paginator, queryset, request, serializer_class):
+    page = await paginator.apaginate_queryset(queryset, request)
+    data = serializer_class(page, many=True, context={'request': request}).data
+    return paginator.get_paginated_response(data).data
+
+
+# ------------------------------  posts  -------------------------------#
+
+@async_read_view
+async def post_list(request):
+    """Async PostCreateOrList list: `/post/async/`."""
+    # the serializer fills its permission choices from the lookup tables
+    await sync_to_async(lookups.permissions_by_name)()
+    queryset = policy_for(request).filter_posts(
+        sparse_queryset(Post.objects.all(), PostSerializerCreateList, request))
+
+    if request.query_params.get('pagination') == 'cursor':
+        return json_response(await paginated_response(
+            PostKeysetPagination(), queryset, request, PostSerializerCreateList))
+
+    paginator = PostPagination()
+    use_cache = request.query_params.get(paginator.count_query_param) != 'exact'
+    cache_key = post_list_key(request)
+    cached = post_list_cache.get(cache_key) if use_cache else None
+
+    if cached is not None:
+        data, etag = cached
+    else:
+        state = await paginator.aget_list_state(queryset, request)
+        etag = list_etag(state, request, policy_for(request).visibility_key)
+        data = None
+
+    response = not_modified(request, etag)
+    if response is None:
+        if data is None:
+            data = await paginated_response(paginator, queryset, request, PostSerializerCreateList)
+            post_list_cache.set(cache_key, (data, etag), response_size(data))
+        response = json_response(data)
+    return set_etag(response, etag)
+
+
+@async_read_view
+async def post_detail(request, pk):
+    """Async PostRetrieveUpdateDestroy retrieve: `/post/async/<pk>/`."""
+    queryset = sparse_queryset(Post.objects.select_related('author'),
+                               PostSerializerRetrieveUpdateDestroy, request)
+    try:
+        post = await queryset.aget(pk=pk)
+    except Post.DoesNotExist:
+        raise NotFound
+
+    # posts the user can't read answer 404
+    if not policy_for(request).can_read(post):
+        raise NotFound
+
+    etag = post_etag(post, request)
+    response = not_modified(request, etag)
+    if response is None:
+        response = json_response(
+            PostSerializerRetrieveUpdateDestroy(post, context={'request': request}).data)
+    return set_etag(response, etag)
@@ -0,0 +1,218 @@
+import json
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F
+from rest_framework import serializers
+
+from avanzatech_blog.sqlite.writes import run_write
+from comments.models import Comment
+from comments.serializers import CommentSerializer
+from likes.models import Like
+from likes.serializers import LikeSerializer
+from user.models import CustomUser
+
+from . import scores
+from .models import Post, PostScore
+from .serializers import PostSerializerCreateList
+from .signals import invalidate_cached_counts
+
+
+# NDJSON import of posts, comments and likes, see the import_ndjson command
+# and PostImport. One JSON object per line, with a "type":
+#   {"type": "post", "id": 7, "author": 3, "title": ..., "post_content": ...,
+#    "public_permission": "read", ..., "author_permission": "edit"}
+#   {"type": "comment", "post_id": 7, "author": 4, "comment_content": ...}
+#   {"type": "like", "post_id": 7, "author": 4}
+# The post "id" is optional, it keeps the ids of an export so that the
+# comments and likes that follow can reference them.
+
+
+# the API serializers, with the foreign keys as plain ids: they are resolved
+# for a whole chunk at once instead of one query per field and record
+
+class PostImportSerializer(PostSerializerCreateList):
+    id = serializers.IntegerField(min_value=1, required=False)
+    author = serializers.IntegerField(min_value=1)
+
+
+class CommentImportSerializer(CommentSerializer):
+    post_id = serializers.IntegerField(min_value=1)
+    author = serializers.IntegerField(min_value=1)
+
+
+class LikeImportSerializer(LikeSerializer):
+    post_id = serializers.IntegerField(min_value=1)
+    author = serializers.IntegerField(min_value=1)
+
+
+SERIALIZERS = {
+    'post': PostImportSerializer,
+    'comment': CommentImportSerializer,
+    'like': LikeImportSerializer,
+}
+
+
+class NdjsonImporter:
+    """
+    Reads NDJSON lines as a stream and imports them `chunk_size` lines at a
+    time. Each chunk is validated in one pass, its authors and posts are
+    looked up with one query each, and its rows are bulk inserted in one
+    transaction, posts first. Posts must come before their comments and likes
+    in the stream, like in the post export.
+
+    run() yields the events of the import:
+    - {'line': n, 'type': ..., 'errors': {...}} for every rejected line
+    - {'progress': totals} after every chunk, the last one is the summary
+    """
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+        self.totals = {'lines': 0, 'posts': 0, 'comments': 0, 'likes': 0, 'errors': 0}
+
+    def run(self, lines):
+        numbered = ((number, line) for number, line in enumerate(lines, 1) if line.strip())
+        while True:
+            chunk = list(islice(numbered, self.chunk_size))
+            if not chunk:
+                break
+            for error in self.import_chunk(chunk):
+                self.totals['errors'] += 1
+                yield error
+            self.totals['lines'] = chunk[-1][0]
+            yield {'progress': dict(self.totals)}
+
+    def import_chunk(self, chunk):
+        """Imports the valid records of `chunk`, returns the errors of the others."""
+        self.errors = []
+        records = self.validate(self.parse(chunk))
+        posts, comments, likes = self.resolve(records)
+
+        if posts or comments or likes:
+            run_write(lambda: self.insert(posts, comments, likes))
+            # bulk inserts skip the signals that drop the cached lists
+            invalidate_cached_counts(sender=Post)
+
+        self.totals['posts'] += len(posts)
+        self.totals['comments'] += len(comments)
+        self.totals['likes'] += len(likes)
+        return sorted(self.errors, key=lambda error: error['line'])
+
+    def reject(self, number, record_type, errors):
+        self.errors.append({'line': number, 'type': record_type, 'errors': errors})
+
+    # -----------------------------  validation  ---------------------------#
+
+    def parse(self, chunk):
+        """{type: [(line number, record)]}"""
+        records = {record_type: [] for record_type in SERIALIZERS}
+        for number, line in chunk:
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                self.reject(number, None, {'json': [str(exc)]})
+                continue
+
+            record_type = record.get('type') if isinstance(record, dict) else None
+            if record_type not in records:
+                self.reject(number, record_type, {'type': [f'Must be one of {", ".join(records)}.']})
+                continue
+            records[record_type].append((number, record))
+        return records
+
+    def validate(self, records):
+        """{type: [(line number, validated data)]}, field checks only."""
+        validated = {}
+        for record_type, items in records.items():
+            validated[record_type] = []
+            if not items:
+                continue
+            # one serializer per type, its fields are only built once
+            serializer = SERIALIZERS[record_type]()
+            for number, record in items:
+                try:
+                    validated[record_type].append((number, serializer.run_validation(record)))
+                except serializers.ValidationError as exc:
+                    self.reject(number, record_type, exc.detail)
+        return validated
+
+    def resolve(self, records):
+        """Checks the foreign keys and the duplicates of the chunk, one query per table."""
+        author_ids = {data['author'] for items in records.values() for _, data in items}
+        users = set(CustomUser.objects.filter(id__in=author_ids).values_list('id', flat=True))
+
+        new_ids = {data['id'] for _, data in records['post'] if 'id' in data}
+        referenced_ids = {data['post_id'] for record_type in ('comment', 'like')
+                          for _, data in records[record_type]}
+        existing_posts = set(Post.objects.filter(id__in=new_ids | referenced_ids)
+                             .values_list('id', flat=True))
+
+        posts, known_posts = [], set(existing_posts)
+        for number, data in records['post']:
+            if data['author'] not in users:
+                self.reject(number, 'post', {'author': [f'Unknown user {data["author"]}.']})
+            elif 'id' in data and data['id'] in known_posts:
+                self.reject(number, 'post', {'id': [f'Post {data["id"]} already exists.']})
+            else:
+                if 'id' in data:
+                    known_posts.add(data['id'])
+                post = dict(data, author_id=data['author'])
+                del post['author']
+                posts.append(post)
+
+        def references(record_type):
+            for number, data in records[record_type]:
+                if data['post_id'] not in known_posts:
+                    self.reject(number, record_type, {'post_id': [f'Unknown post {data["post_id"]}.']})
+                elif data['author'] not in users:
+                    self.reject(number, record_type, {'author': [f'Unknown user {data["author"]}.']})
+                else:
+                    yield number, data
+
+        comments = [data for _, data in references('comment')]
+
+        likes, liked = [], set()
+        like_items = list(references('like'))
+        if like_items:
+            liked = set(Like.objects.filter(
+                post_id__in={data['post_id'] for _, data in like_items},
+                author__in={data['author'] for _, data in like_items}).values_list('post_id', 'author'))
+        for number, data in like_items:
+            pair = (data['post_id'], data['author'])
+            if pair in liked:
+                self.reject(number, 'like', {'non_field_errors': ['Already liked.']})
+            else:
+                liked.add(pair)
+                likes.append(data)
+
+        return posts, comments, likes
+
+    # ------------------------------  insert  ------------------------------#
+
+    def insert(self, posts, comments, likes):
+        with transaction.atomic():
+            if posts:
+                # the batch create of the API: posts and their permission rows.
+                # It pops the permissions, copies keep the data for a retry
+                PostSerializerCreateList(many=True).create([dict(data) for data in posts])
+
+            Comment.objects.bulk_create([
+                Comment(post_id_id=data['post_id'], author_id=data['author'],
+                        comment_content=data['comment_content'])
+                for data in comments])
+            Like.objects.bulk_create([
+                Like(post_id_id=data['post_id'], author_id=data['author']) for data in likes])
+
+            # one counter and one score UPDATE per distinct (likes, comments) increment
+            like_counts = Counter(data['post_id'] for data in likes)
+            comment_counts = Counter(data['post_id'] for data in comments)
+            increments = defaultdict(list)
+            for post_id in like_counts.keys() | comment_counts.keys():
+                increments[like_counts[post_id], comment_counts[post_id]].append(post_id)
+            for (like_count, comment_count), post_ids in increments.items():
+                Post.objects.filter(pk__in=post_ids).update(
+                    like_count=F('like_count') + like_count,
+                    comment_count=F('comment_count') + comment_count)
+                PostScore.record(post_ids, like_count * scores.LIKE_WEIGHT +
+                                 comment_count * scores.COMMENT_WEIGHT)
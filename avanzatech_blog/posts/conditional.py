@@ -0,0 +1,49 @@
+from hashlib import md5
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+
+# Validators of the post endpoints, for If-None-Match. They are computed
+# from the post row (detail) or from the cached list aggregates (list) before
+# anything is serialized.
+#
+# Only ETags are sent: the bodies carry the like and comment counters, which
+# don't move modified_at, and a list also changes when an older post is
+# deleted, so no date covers them. A Last-Modified would let a client
+# revalidating by date (If-Modified-Since) keep a stale copy.
+
+
+def make_etag(*parts, weak=False):
+    etag = quote_etag(md5('|'.join(map(str, parts)).encode()).hexdigest())
+    return f'W/{etag}' if weak else etag
+
+
+def post_etag(post, request):
+    """Strong ETag of the representation of one post."""
+    # the counters are part of the body but don't move modified_at
+    return make_etag(post.id, post.modified_at.isoformat(), post.like_count,
+                     post.comment_count, request.query_params.get('fields', ''))
+
+
+def list_etag(state, request, visibility_key):
+    """
+    Weak ETag of a list page, from the aggregates of the visible set (see
+    PostPagination.list_aggregates): any create, edit, delete or visibility
+    change moves the latest modified_at or the count, likes and comments
+    their sums.
+    """
+    last_modified = state['last_modified']
+    return make_etag(visibility_key, request.get_full_path(), state['count'],
+                     last_modified.isoformat() if last_modified else '',
+                     state['likes'], state['comments'], weak=True)
+
+
+def not_modified(request, etag):
+    """The 304 response when the client copy is still valid, otherwise None."""
+    return get_conditional_response(request, etag=etag)
+
+
+def set_etag(response, etag):
+    response['ETag'] = etag
+    return response
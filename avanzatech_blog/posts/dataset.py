@@ -0,0 +1,66 @@
+import random
+
+# Synthetic rows for benchmark databases, see the generate_dataset command.
+# Nothing here touches the ORM: shards are built as plain tuples in worker
+# processes and inserted by the parent one, SQLite only has a single writer.
+
+
+# (weight, {category name: permission name}): most posts are open to
+# everybody, a few are only readable by their author
+GRANT_MIXES = [
+    (50, {'public': 'read', 'authenticated': 'read', 'team': 'edit', 'author': 'edit'}),
+    (20, {'public': 'none', 'authenticated': 'read', 'team': 'read', 'author': 'edit'}),
+    (20, {'public': 'none', 'authenticated': 'none', 'team': 'edit', 'author': 'edit'}),
+    (10, {'public': 'none', 'authenticated': 'none', 'team': 'none', 'author': 'edit'}),
+]
+
+
+def zipf_sizes(count, total, exponent, rng, minimum=0):
+    """
+    `count` sizes adding up to `total`, the n-th largest one being proportional
+    to 1 / n ** exponent. Shuffled, so the big ones land anywhere.
+    """
+    if not count:
+        return []
+    weights = [1 / rank ** exponent for rank in range(1, count + 1)]
+    scale = total / sum(weights)
+    sizes = [max(minimum, round(weight * scale)) for weight in weights]
+    # rounding leftovers go to the largest one, `minimum` may still push the sum over
+    sizes[0] = max(minimum, sizes[0] + round(total) - sum(sizes))
+    rng.shuffle(sizes)
+    return sizes
+
+
+def build_shard(shard):
+    """
+    Rows of one shard of posts. `shard` is a dict with:
+    - first_post_id: id of the first post of the shard, ids are contiguous
+    - like_counts: likes of each post of the shard
+    - first_user_id, user_count: contiguous range of user ids
+    - comments_per_post: mean number of comments of a post
+    - seed: random seed, the same shard always gives the same rows
+
+    Returns (posts, likes, comments):
+    - posts: [(post id, author id, GRANT_MIXES index, title, content)]
+    - likes: [(post id, user id)], a user likes a post at most once
+    - comments: [(post id, user id, content)]
+    """
+    rng = random.Random(shard['seed'])
+    user_ids = range(shard['first_user_id'], shard['first_user_id'] + shard['user_count'])
+    mix_weights = [weight for weight, _ in GRANT_MIXES]
+    mixes = rng.choices(range(len(GRANT_MIXES)), weights=mix_weights, k=len(shard['like_counts']))
+
+    posts, likes, comments = [], [], []
+    for offset, (like_count, mix) in enumerate(zip(shard['like_counts'], mixes)):
+        post_id = shard['first_post_id'] + offset
+        posts.append((post_id, rng.choice(user_ids), mix,
+                      f'post {post_id}', f'synthetic content of post {post_id} ' * rng.randint(1, 20)))
+
+        likes.extend((post_id, user_id)
+                     for user_id in rng.sample(user_ids, min(like_count, len(user_ids))))
+
+        comment_count = rng.randint(0, 2 * shard['comments_per_post'])
+        comments.extend((post_id, rng.choice(user_ids), f'comment {n} on post {post_id}')
+                        for n in range(comment_count))
+
+    return posts, likes, comments
@@ -1,5 +1,5 @@
 import factory
-from .models import Post
+from .models import Post, AccessLevel
 from faker import Faker
 from user.factories import CustomUserFactory
 from factory.django import DjangoModelFactory
@@ -11,10 +11,16 @@ class PostFactory(DjangoModelFactory):
     class Meta:
         model = Post
 
+    class Params:
+        # widest category allowed to read the post: 'public', 'authenticated', 'team' or 'author'
+        permission = 'author'
+
     title = fake.word()
     post_content = fake.text(max_nb_chars=10)
     # Assuming you have a CustomUserFactory
     author = factory.SubFactory(CustomUserFactory)
-    
+    read_level = factory.LazyAttribute(
+        lambda post: AccessLevel.from_category(post.permission))
+
     created_at = fake.date_time_this_decade()
     modified_at = fake.date_time_this_decade()
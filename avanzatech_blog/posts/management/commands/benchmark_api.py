@@ -0,0 +1,298 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from comments.models import Comment
+from feed.models import FeedEntry
+from likes.models import Like
+from posts import scores
+from posts.models import Post, PostScore, AccessLevel
+from teams.models import Team
+from user.models import CustomUser
+
+
+ROLES = ['anonymous', 'authenticated', 'same_team', 'staff']
+
+POST_DATA = {
+    'title': 'benchmark',
+    'post_content': 'benchmark content',
+    'public_permission': 'read',
+    'authenticated_permission': 'read',
+    'team_permission': 'read',
+    'author_permission': 'edit',
+}
+
+
+class Command(BaseCommand):
+    help = ('Benchmark every API endpoint for anonymous, authenticated, same-team and staff '
+            'users over a seeded throw-away database, and report latency percentiles, '
+            'throughput and queries per request as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=500,
+                            help='number of posts seeded, each with two likes and two comments')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='timed requests per endpoint and role')
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='untimed requests per endpoint and role')
+        parser.add_argument('--output', help='write the JSON report to this file')
+        parser.add_argument('--baseline', help='compare against a report saved with --output')
+        parser.add_argument('--tolerance', type=float, default=20.0,
+                            help='allowed p95 slowdown against the baseline, in percent')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2:
+            raise CommandError('--requests must be at least 2 to compute percentiles.')
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        # the benchmark runs against a test database, the configured one is never touched
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.seed(options['posts'])
+            report = {
+                'meta': {
+                    'posts': options['posts'],
+                    'requests': options['requests'],
+                    'warmup': options['warmup'],
+                    'database': connection.vendor,
+                },
+                'results': self.run_scenarios(options['requests'], options['warmup']),
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+        self.stdout.write(output)
+
+        if baseline is not None:
+            self.compare(report, baseline, options['tolerance'])
+
+    # -----------------------------  dataset  ------------------------------#
+
+    def seed(self, size):
+        team, other_team = Team.objects.bulk_create(
+            [Team(team_name='benchmark'), Team(team_name='benchmark other')])
+
+        def user(name, team_id, **extra_fields):
+            return CustomUser.objects.create_user(
+                email=f'{name}@benchmark.local', password='benchmark',
+                username=name, team_id=team_id, **extra_fields)
+
+        self.users = {
+            'anonymous': None,
+            'authenticated': user('authenticated', other_team),
+            'same_team': user('same_team', team),
+            'staff': user('staff', other_team, is_staff=True),
+        }
+        self.authors = [user('author', team), user('other_author', other_team)]
+        likers = self.authors + [u for u in self.users.values() if u]
+
+        read_levels = list(AccessLevel)
+        posts = Post.objects.bulk_create([
+            Post(title=f'post {i}', post_content=f'content {i}', excerpt=f'content {i}',
+                 author=self.authors[i % len(self.authors)],
+                 read_level=read_levels[i % len(read_levels)], like_count=2, comment_count=2)
+            for i in range(size)])
+        Like.objects.bulk_create([
+            Like(post_id=post, author=likers[(i + offset) % len(likers)])
+            for i, post in enumerate(posts) for offset in range(2)])
+        Comment.objects.bulk_create([
+            Comment(post_id=post, author=likers[(i + offset) % len(likers)], comment_content='comment')
+            for i, post in enumerate(posts) for offset in range(2)])
+        # bulk inserts skip the signal that fans the posts out to the feeds
+        FeedEntry.fan_out(posts)
+        # scores spread over the posts, so the rankings have an order to walk
+        now = timezone.now()
+        PostScore.objects.bulk_create([
+            PostScore(post_id=post, score=1 + i % 97,
+                      trending=scores.trending_term(1 + i % 97, now - timedelta(hours=i % 72)))
+            for i, post in enumerate(posts)])
+
+        self.public_posts = [post for post in posts if post.read_level == AccessLevel.PUBLIC]
+        if not self.public_posts:
+            raise CommandError('--posts is too small to seed public posts.')
+
+    # ----------------------------  scenarios  -----------------------------#
+
+    def scenarios(self):
+        """
+        {name: prepare(role, user, i) -> (method, url, data[, options])}.
+        prepare runs outside the timed section, so it can create the rows a
+        request needs. `options` are the keyword arguments of the client call,
+        JSON bodies by default.
+        """
+        def public_post(i):
+            return self.public_posts[i % len(self.public_posts)]
+
+        def owned_post(user):
+            return Post.objects.create(title='benchmark', post_content='benchmark',
+                                       author=user or self.authors[0], read_level=AccessLevel.PUBLIC)
+
+        def like(user, i):
+            user = user or self.authors[0]
+            post = owned_post(user)
+            Like.objects.create(post_id=post, author=user)
+            return reverse('likesDestroy', kwargs={'author': user.id, 'post_id': post.id})
+
+        def comment(user):
+            comment = Comment.objects.create(post_id=owned_post(user), author=user or self.authors[0],
+                                             comment_content='benchmark')
+            return reverse('commentsDestroy', kwargs={'pk': comment.id})
+
+        def author_id(user):
+            return user.id if user else None
+
+        return {
+            'docs': lambda role, user, i: (
+                'get', reverse('schema-swagger-ui') + '?format=openapi', None),
+            'post_list': lambda role, user, i: (
+                'get', reverse('postCreateOrList'), None),
+            'post_list_cursor': lambda role, user, i: (
+                'get', reverse('postCreateOrList') + '?pagination=cursor', None),
+            'post_search': lambda role, user, i: (
+                'get', reverse('postSearch') + f'?q=content {i}', None),
+            'post_engagement': lambda role, user, i: (
+                'get', reverse('postEngagement') + '?ids=' + ','.join(
+                    str(public_post(i + offset).id) for offset in range(10)), None),
+            'post_top': lambda role, user, i: (
+                'get', reverse('postTop'), None),
+            'post_trending': lambda role, user, i: (
+                'get', reverse('postTrending'), None),
+            'post_create': lambda role, user, i: (
+                'post', reverse('postCreateOrList'), POST_DATA),
+            'post_retrieve': lambda role, user, i: (
+                'get', reverse('postRetrieveUpdateDestroy', kwargs={'pk': public_post(i).id}), None),
+            'post_destroy': lambda role, user, i: (
+                'delete', reverse('postRetrieveUpdateDestroy', kwargs={'pk': owned_post(user).id}), None),
+            'post_update': lambda role, user, i: (
+                'patch', reverse('postRetrieveUpdateDestroy', kwargs={'pk': owned_post(user).id}),
+                {'title': 'benchmark patched'}),
+            'like_list': lambda role, user, i: (
+                'get', reverse('likesList'), None),
+            'like_create': lambda role, user, i: (
+                'post', reverse('likesCreate'), {'post_id': public_post(i).id, 'author': author_id(user)}),
+            'like_destroy': lambda role, user, i: (
+                'delete', like(user, i), None),
+            'like_toggle': lambda role, user, i: (
+                'put', reverse('likesToggle', kwargs={'post_id': public_post(i).id}), None),
+            'comment_list': lambda role, user, i: (
+                'get', reverse('commentsList'), None),
+            'comment_create': lambda role, user, i: (
+                'post', reverse('commentsCreate'),
+                {'post_id': public_post(i).id, 'author': author_id(user), 'comment_content': 'benchmark'}),
+            'comment_destroy': lambda role, user, i: (
+                'delete', comment(user), None),
+            # a failed login: the password check without the redirect of a
+            # successful one, every role sends the same form
+            'feed': lambda role, user, i: (
+                'get', reverse('feedList'), None),
+            'post_export': lambda role, user, i: (
+                'get', reverse('postExport'), None),
+            # staff only: one comment line per request
+            'post_import': lambda role, user, i: (
+                'post', reverse('postImport'),
+                json.dumps({'type': 'comment', 'post_id': public_post(i).id,
+                            'author': self.authors[0].id, 'comment_content': 'benchmark'}) + '\n',
+                {'content_type': 'application/x-ndjson'}),
+            # the async read views, served here through the sync test handler
+            'post_list_async': lambda role, user, i: (
+                'get', reverse('postListAsync'), None),
+            'post_retrieve_async': lambda role, user, i: (
+                'get', reverse('postRetrieveAsync', kwargs={'pk': public_post(i).id}), None),
+            'like_list_async': lambda role, user, i: (
+                'get', reverse('likesListAsync'), None),
+            'comment_list_async': lambda role, user, i: (
+                'get', reverse('commentsListAsync'), None),
+            'login': lambda role, user, i: (
+                'post', reverse('login'), {'username': 'author@benchmark.local', 'password': 'wrong'},
+                {'format': 'multipart'}),
+        }
+
+    def run_scenarios(self, requests, warmup):
+        results = {}
+        for name, prepare in self.scenarios().items():
+            results[name] = {}
+            for role in ROLES:
+                user = self.users[role]
+                client = APIClient()
+                client.force_authenticate(user=user)
+
+                for i in range(warmup):
+                    self.send(client, *prepare(role, user, i))
+
+                latencies, queries, statuses = [], [], set()
+                for i in range(warmup, warmup + requests):
+                    prepared = prepare(role, user, i)
+                    with CaptureQueriesContext(connection) as captured:
+                        start = time.perf_counter()
+                        response = self.send(client, *prepared)
+                        latencies.append(time.perf_counter() - start)
+                    queries.append(len(captured))
+                    statuses.add(response.status_code)
+
+                results[name][role] = self.summarize(latencies, queries, statuses)
+                # cached list counts must not leak from one role to the next run
+                cache.clear()
+        return results
+
+    def send(self, client, method, url, data, options=None):
+        response = getattr(client, method)(url, data, **(options or {'format': 'json'}))
+        if response.streaming:
+            # streamed bodies are produced while they are read
+            b''.join(response.streaming_content)
+        return response
+
+    def summarize(self, latencies, queries, statuses):
+        cut_points = statistics.quantiles(latencies, n=100, method='inclusive')
+        return {
+            'requests': len(latencies),
+            'status_codes': sorted(statuses),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+            'p50_ms': round(cut_points[49] * 1000, 3),
+            'p95_ms': round(cut_points[94] * 1000, 3),
+            'p99_ms': round(cut_points[98] * 1000, 3),
+            'throughput_rps': round(len(latencies) / sum(latencies), 1),
+            'queries_per_request': round(statistics.fmean(queries), 2),
+        }
+
+    # -----------------------------  baseline  -----------------------------#
+
+    def compare(self, report, baseline, tolerance):
+        regressions = []
+        for name, roles in report['results'].items():
+            for role, result in roles.items():
+                previous = baseline.get('results', {}).get(name, {}).get(role)
+                if previous is None:
+                    continue
+
+                slowdown = (result['p95_ms'] / previous['p95_ms'] - 1) * 100 if previous['p95_ms'] else 0
+                line = (f"{name:<18} {role:<14} p95 {previous['p95_ms']:>9.3f} -> {result['p95_ms']:>9.3f} ms "
+                        f"({slowdown:+.1f}%)  queries {previous['queries_per_request']} -> {result['queries_per_request']}")
+
+                if slowdown > tolerance or result['queries_per_request'] > previous['queries_per_request']:
+                    regressions.append(line)
+                    self.stderr.write(self.style.ERROR(line))
+                else:
+                    self.stderr.write(line)
+
+        if regressions:
+            raise CommandError(f'{len(regressions)} endpoint(s) regressed against the baseline.')
+        self.stderr.write(self.style.SUCCESS('No regression against the baseline.'))
@@ -0,0 +1,158 @@
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+from avanzatech_blog.sqlite.writes import run_write
+
+
+# (database settings, retry and queue the writes): the stock backend as it was
+# configured before, the tuned one, and the tuned one with the write queue
+MODES = {
+    'stock': ({'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}}, False, False),
+    'tuned': ({'ENGINE': 'avanzatech_blog.sqlite', 'OPTIONS': settings.SQLITE_OPTIONS}, True, False),
+    'tuned_queue': ({'ENGINE': 'avanzatech_blog.sqlite', 'OPTIONS': settings.SQLITE_OPTIONS}, True, True),
+}
+
+SCHEMA = [
+    'CREATE TABLE bench_post (id INTEGER PRIMARY KEY, title TEXT NOT NULL, like_count INTEGER NOT NULL)',
+    'CREATE TABLE bench_like (id INTEGER PRIMARY KEY, post_id INTEGER NOT NULL, author_id INTEGER NOT NULL)',
+    'CREATE INDEX bench_like_post_id ON bench_like (post_id)',
+]
+
+
+class Command(BaseCommand):
+    help = ('Run concurrent reader and writer threads against a throw-away SQLite file, with '
+            'the stock backend and with the tuned one (WAL and pragmas, immediate transactions, '
+            'write retries, optionally the write queue), and report their throughput as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='reader threads')
+        parser.add_argument('--writers', type=int, default=4, help='writer threads')
+        parser.add_argument('--seconds', type=float, default=5.0, help='duration of each mode')
+        parser.add_argument('--posts', type=int, default=1000, help='posts seeded')
+        parser.add_argument('--modes', default=','.join(MODES),
+                            help=f'comma separated, among {", ".join(MODES)}')
+        parser.add_argument('--output', help='write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        modes = [mode for mode in options['modes'].split(',') if mode]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f'Unknown mode(s): {", ".join(sorted(unknown))}.')
+        if options['readers'] < 0 or options['writers'] < 0 or options['posts'] < 1:
+            raise CommandError('--readers and --writers can not be negative, --posts must be at least 1.')
+
+        report = {
+            'meta': {key: options[key] for key in ('readers', 'writers', 'seconds', 'posts')},
+            'results': {mode: self.run_mode(mode, options) for mode in modes},
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+        self.stdout.write(output)
+
+    def run_mode(self, mode, options):
+        database, retry, serialize = MODES[mode]
+        alias = f'benchmark_{mode}'
+        with tempfile.TemporaryDirectory() as directory:
+            # the configured databases are never touched
+            connections.settings[alias] = dict(
+                connections[DEFAULT_DB_ALIAS].settings_dict, **database,
+                NAME=os.path.join(directory, 'benchmark.sqlite3'))
+            try:
+                self.seed(alias, options['posts'])
+                return self.run_threads(alias, options, retry, serialize)
+            finally:
+                connections[alias].close()
+                del connections[alias]
+                del connections.settings[alias]
+
+    def seed(self, alias, posts):
+        with connections[alias].cursor() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+            cursor.executemany('INSERT INTO bench_post (id, title, like_count) VALUES (%s, %s, 0)',
+                               [(n, f'post {n}') for n in range(1, posts + 1)])
+
+    # -----------------------------  threads  ------------------------------#
+
+    def run_threads(self, alias, options, retry, serialize):
+        deadline = time.perf_counter() + options['seconds']
+        results = {'read': [], 'write': []}
+
+        def read(rng):
+            # a page of posts and the likes of one of them, like the post list
+            first = rng.randint(1, options['posts'])
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT id, title, like_count FROM bench_post WHERE id >= %s ORDER BY id LIMIT 10',
+                               [first])
+                cursor.fetchall()
+                cursor.execute('SELECT COUNT(*) FROM bench_like WHERE post_id = %s', [first])
+                cursor.fetchone()
+
+        def write(rng):
+            # a like: existence check, insert and counter update in one transaction
+            post_id, author_id = rng.randint(1, options['posts']), rng.randint(1, 10000)
+            with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1 FROM bench_like WHERE post_id = %s AND author_id = %s',
+                               [post_id, author_id])
+                cursor.fetchone()
+                cursor.execute('INSERT INTO bench_like (post_id, author_id) VALUES (%s, %s)',
+                               [post_id, author_id])
+                cursor.execute('UPDATE bench_post SET like_count = like_count + 1 WHERE id = %s', [post_id])
+
+        def loop(kind, operation, seed):
+            rng = random.Random(seed)
+            latencies, errors = [], 0
+            try:
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        if kind == 'write' and retry:
+                            run_write(lambda: operation(rng), using=alias, serialize=serialize)
+                        else:
+                            operation(rng)
+                    except OperationalError:
+                        errors += 1
+                        continue
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                # connections are per thread
+                connections[alias].close()
+            results[kind].append((latencies, errors))
+
+        threads = [threading.Thread(target=loop, args=('read', read, n)) for n in range(options['readers'])]
+        threads += [threading.Thread(target=loop, args=('write', write, -n - 1)) for n in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return {kind: self.summarize(kind_results, options['seconds'])
+                for kind, kind_results in results.items() if kind_results}
+
+    def summarize(self, thread_results, seconds):
+        latencies = [latency for thread_latencies, _ in thread_results for latency in thread_latencies]
+        summary = {
+            'operations': len(latencies),
+            'errors': sum(errors for _, errors in thread_results),
+            'throughput_ops': round(len(latencies) / seconds, 1),
+        }
+        if len(latencies) > 1:
+            cut_points = statistics.quantiles(latencies, n=100, method='inclusive')
+            summary.update({
+                'p50_ms': round(cut_points[49] * 1000, 3),
+                'p95_ms': round(cut_points[94] * 1000, 3),
+                'p99_ms': round(cut_points[98] * 1000, 3),
+            })
+        return summary
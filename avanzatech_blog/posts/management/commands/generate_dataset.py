@@ -0,0 +1,186 @@
+import os
+import random
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from comments.models import Comment
+from feed.models import FeedEntry
+from likes.models import Like
+from postCategoryPermission.models import postCategoryPermission
+from posts import dataset, scores
+from posts.models import Post, PostScore, AccessLevel
+from posts.pagination import bump_count_version
+from teams.models import Team
+from user.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ('Fill the database with synthetic teams, users, posts, post permissions, likes and '
+            'comments using bulk inserts. Team sizes and likes per post follow a Zipf law.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=50)
+        parser.add_argument('--users', type=int, default=5000,
+                            help='raised if needed so that every team gets a member')
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--likes-per-post', type=float, default=5,
+                            help='mean likes per post, spread with a Zipf law')
+        parser.add_argument('--comments-per-post', type=int, default=2,
+                            help='mean comments per post')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='exponent of the team size and likes per post distributions')
+        parser.add_argument('--password', default='dataset',
+                            help='password of every generated user, hashed once')
+        parser.add_argument('--prefix', default='dataset',
+                            help='prefix of the generated team names and user emails')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='processes building the post shards')
+        parser.add_argument('--shard-size', type=int, default=10000,
+                            help='posts per shard, each shard is inserted in its own transaction')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='rows per bulk_create statement')
+        parser.add_argument('--snapshot',
+                            help='copy the resulting SQLite database to this file')
+
+    def handle(self, *args, **options):
+        if options['snapshot'] and connection.vendor != 'sqlite':
+            raise CommandError('--snapshot needs a SQLite database.')
+        if options['teams'] < 1 or options['users'] < 1:
+            raise CommandError('--teams and --users must be at least 1.')
+
+        start = time.perf_counter()
+        rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        first_user_id, user_count = self.create_users(options, rng)
+        post_count, like_count, comment_count = self.create_posts(options, rng, first_user_id, user_count)
+        # bulk_create skips the signals that drop the cached list counts
+        bump_count_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["teams"]} teams, {user_count} users, {post_count} posts, {like_count} likes '
+            f'and {comment_count} comments created in {time.perf_counter() - start:.1f}s.'))
+
+        if options['snapshot']:
+            self.snapshot(options['snapshot'])
+            self.stdout.write(self.style.SUCCESS(f'Snapshot written to {options["snapshot"]}.'))
+
+    # -------------------------------  users  ------------------------------#
+
+    def create_users(self, options, rng):
+        """Returns the contiguous range of user ids as (first id, count)."""
+        # hashing is slow by design: every user shares the same hash
+        password = make_password(options['password'])
+        prefix = options['prefix']
+        team_sizes = dataset.zipf_sizes(options['teams'], options['users'], options['zipf'], rng, minimum=1)
+
+        with transaction.atomic():
+            teams = Team.objects.bulk_create(
+                [Team(team_name=f'{prefix} team {n}') for n in range(options['teams'])],
+                batch_size=self.batch_size)
+
+            # explicit ids, so the post shards can reference users without reading them back
+            first_user_id = (CustomUser.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+            team_of_users = [team for team, size in zip(teams, team_sizes) for _ in range(size)]
+            CustomUser.objects.bulk_create([
+                CustomUser(id=first_user_id + n, team_id=team, password=password,
+                           email=f'{prefix}-user-{first_user_id + n}@example.com',
+                           username=f'{prefix} user {first_user_id + n}')
+                for n, team in enumerate(team_of_users)], batch_size=self.batch_size)
+
+        return first_user_id, len(team_of_users)
+
+    # -------------------------------  posts  ------------------------------#
+
+    def create_posts(self, options, rng, first_user_id, user_count):
+        post_count = options['posts']
+        shard_size = options['shard_size']
+        like_counts = [min(count, user_count) for count in dataset.zipf_sizes(
+            post_count, post_count * options['likes_per_post'], options['zipf'], rng)]
+        first_post_id = (Post.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+
+        shards = [{
+            'first_post_id': first_post_id + offset,
+            'like_counts': like_counts[offset:offset + shard_size],
+            'first_user_id': first_user_id,
+            'user_count': user_count,
+            'comments_per_post': options['comments_per_post'],
+            'seed': options['seed'] * 1000003 + offset,
+        } for offset in range(0, post_count, shard_size)]
+
+        # shards are built in parallel and inserted in order as they come back
+        executor = None
+        if options['workers'] > 1 and len(shards) > 1:
+            executor = ProcessPoolExecutor(max_workers=options['workers'])
+
+        like_count = comment_count = 0
+        try:
+            for rows in (executor.map if executor else map)(dataset.build_shard, shards):
+                shard_likes, shard_comments = self.insert_shard(*rows)
+                like_count += shard_likes
+                comment_count += shard_comments
+        finally:
+            if executor:
+                executor.shutdown()
+
+        return post_count, like_count, comment_count
+
+    def insert_shard(self, post_rows, like_rows, comment_rows):
+        read_levels = [AccessLevel.from_grants(grants) for _, grants in dataset.GRANT_MIXES]
+        like_counts = Counter(post_id for post_id, _ in like_rows)
+        comment_counts = Counter(post_id for post_id, _, _ in comment_rows)
+
+        posts = []
+        for post_id, author_id, mix, title, content in post_rows:
+            post = Post(id=post_id, author_id=author_id, title=title, post_content=content,
+                        read_level=read_levels[mix], like_count=like_counts[post_id],
+                        comment_count=comment_counts[post_id])
+            post.fill_excerpt()
+            posts.append(post)
+
+        with transaction.atomic():
+            Post.objects.bulk_create(posts, batch_size=self.batch_size)
+            postCategoryPermission.objects.bulk_create([
+                row for post, (_, _, mix, _, _) in zip(posts, post_rows)
+                for row in postCategoryPermission.rows_for(post, dataset.GRANT_MIXES[mix][1])],
+                batch_size=self.batch_size)
+            FeedEntry.objects.bulk_create(FeedEntry.entries_for(posts), batch_size=self.batch_size)
+            Like.objects.bulk_create(
+                [Like(post_id_id=post_id, author_id=user_id) for post_id, user_id in like_rows],
+                batch_size=self.batch_size)
+            Comment.objects.bulk_create(
+                [Comment(post_id_id=post_id, author_id=user_id, comment_content=content)
+                 for post_id, user_id, content in comment_rows],
+                batch_size=self.batch_size)
+            # the likes and comments of the shard are all made now
+            now = timezone.now()
+            post_scores = []
+            for post in posts:
+                score = post.like_count * scores.LIKE_WEIGHT + post.comment_count * scores.COMMENT_WEIGHT
+                if score:
+                    post_scores.append(PostScore(post_id=post, score=score,
+                                                 trending=scores.trending_term(score, now)))
+            PostScore.objects.bulk_create(post_scores, batch_size=self.batch_size)
+
+        return len(like_rows), len(comment_rows)
+
+    # ------------------------------  snapshot  ----------------------------#
+
+    def snapshot(self, path):
+        """Online copy of the database, the file can be used as NAME of another settings."""
+        connection.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            with target:
+                connection.connection.backup(target)
+        finally:
+            target.close()
@@ -0,0 +1,45 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.bulk_import import NdjsonImporter
+
+
+class Command(BaseCommand):
+    help = ('Import posts, comments and likes from an NDJSON file (see posts.bulk_import), '
+            'read as a stream and bulk inserted a chunk at a time. Rejected lines are written '
+            'to stderr as JSON, with their line number and errors.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="NDJSON file, '-' reads stdin")
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='lines validated and inserted per transaction')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        if options['path'] == '-':
+            self.run(sys.stdin.buffer, options)
+            return
+        try:
+            source = open(options['path'], 'rb')
+        except OSError as exc:
+            raise CommandError(f'Cannot read {options["path"]}: {exc}.')
+        with source:
+            self.run(source, options)
+
+    def run(self, source, options):
+        importer = NdjsonImporter(chunk_size=options['chunk_size'])
+        for event in importer.run(source):
+            if 'progress' in event:
+                if options['verbosity'] > 1:
+                    self.stdout.write(json.dumps(event['progress']))
+            else:
+                self.stderr.write(json.dumps(event))
+
+        totals = importer.totals
+        self.stdout.write(self.style.SUCCESS(
+            f'{totals["lines"]} lines read: {totals["posts"]} posts, {totals["comments"]} comments '
+            f'and {totals["likes"]} likes imported, {totals["errors"]} lines rejected.'))
@@ -0,0 +1,55 @@
+from itertools import chain
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from comments.models import Comment
+from likes.models import Like
+from posts import scores
+from posts.models import Post, PostScore
+
+
+class Command(BaseCommand):
+    help = ('Recompute the PostScore rows (all-time and trending scores) from the likes and '
+            'comments tables, walking the posts by id in chunks.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='posts rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        checked = scored = 0
+        last_id = 0
+        while True:
+            ids = list(Post.objects.filter(id__gt=last_id).order_by('id')
+                       .values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                break
+            first_id, last_id = ids[0], ids[-1]
+            checked += len(ids)
+
+            # read and written in one transaction, so likes and comments
+            # made meanwhile are not lost
+            with transaction.atomic():
+                events = chain(
+                    ((post_id, scores.LIKE_WEIGHT, created_at) for post_id, created_at
+                     in Like.objects.filter(post_id__gte=first_id, post_id__lte=last_id)
+                     .values_list('post_id', 'created_at')),
+                    ((post_id, scores.COMMENT_WEIGHT, created_at) for post_id, created_at
+                     in Comment.objects.filter(post_id__gte=first_id, post_id__lte=last_id)
+                     .values_list('post_id', 'created_at')))
+                rows = [PostScore(post_id_id=post_id, score=score, trending=trending)
+                        for post_id, (score, trending) in scores.scores_from_events(events).items()]
+                PostScore.objects.filter(post_id__gte=first_id, post_id__lte=last_id).delete()
+                PostScore.objects.bulk_create(rows)
+            scored += len(rows)
+
+            if options['verbosity'] > 1:
+                self.stdout.write(f'posts {first_id}-{last_id}: {len(rows)} scored')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{checked} posts checked, {scored} with likes or comments scored.'))
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, OuterRef, Q, Subquery, F
+from django.db.models.functions import Coalesce
+
+from comments.models import Comment
+from likes.models import Like
+from posts.models import Post
+from posts.signals import invalidate_cached_counts
+
+
+def count_of(model):
+    """Number of `model` rows of the outer post, as a subquery expression."""
+    rows = model.objects.filter(post_id=OuterRef('pk')).order_by().values(
+        'post_id').annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(rows), 0)
+
+
+class Command(BaseCommand):
+    help = ('Recount Post.like_count and Post.comment_count from the likes and comments '
+            'tables, walking the posts by id in chunks, and fix the posts that drifted.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='posts checked per query')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='only report the posts that drifted')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        checked = drifted = 0
+        last_id = 0
+        while True:
+            chunk = Post.objects.filter(id__gt=last_id).order_by('id')[:chunk_size]
+            ids = list(chunk.values_list('id', flat=True))
+            if not ids:
+                break
+            last_id = ids[-1]
+            checked += len(ids)
+
+            drifted_ids = list(
+                Post.objects.filter(id__gte=ids[0], id__lte=last_id)
+                .annotate(likes=count_of(Like), comments=count_of(Comment))
+                .filter(~Q(like_count=F('likes')) | ~Q(comment_count=F('comments')))
+                .values_list('id', flat=True))
+            drifted += len(drifted_ids)
+
+            if drifted_ids and not options['dry_run']:
+                # recounted by the UPDATE itself, so writes that happened
+                # since the check are not overwritten with stale numbers
+                Post.objects.filter(id__in=drifted_ids).update(
+                    like_count=count_of(Like), comment_count=count_of(Comment))
+
+            if options['verbosity'] > 1 and drifted_ids:
+                self.stdout.write(f'posts {ids[0]}-{last_id}: {len(drifted_ids)} drifted')
+
+        if drifted and not options['dry_run']:
+            # queryset updates skip the signals that drop the cached lists
+            invalidate_cached_counts(sender=Post)
+
+        action = 'found' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{checked} posts checked, {drifted} with drifted counts {action}.'))
@@ -0,0 +1,34 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database over every alias of settings.DATABASE_REPLICAS. '
+            'Stands in for replication when running with local replica files.')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replica configured, set the DATABASE_REPLICAS environment variable.')
+
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('sync_replicas only copies SQLite databases.')
+        primary.ensure_connection()
+
+        for alias in settings.DATABASE_REPLICAS:
+            copy_database(primary, connections[alias])
+            self.stdout.write(self.style.SUCCESS(f'{alias} synced from {DEFAULT_DB_ALIAS}.'))
+
+
+def copy_database(primary, replica):
+    # the replica connection of this process would keep reading its old pages
+    replica.close()
+    target = sqlite3.connect(replica.settings_dict['NAME'])
+    try:
+        with target:
+            primary.connection.backup(target)
+    finally:
+        target.close()
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+LEGACY_PERMISSION_TO_READ_LEVEL = {
+    'public': 0,
+    'authenticated': 1,
+    'team': 2,
+    'author': 3,
+}
+
+
+def backfill_read_level(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    for permission, read_level in LEGACY_PERMISSION_TO_READ_LEVEL.items():
+        Post.objects.filter(permission=permission).update(read_level=read_level)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='read_level',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'public'), (1, 'authenticated'), (2, 'team'), (3, 'author')], db_index=True, default=3),
+        ),
+        migrations.RunPython(backfill_read_level, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='post',
+            name='permission',
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.1 on 2026-10-18 14:10
+
+from django.db import migrations
+
+
+# External content FTS5 index over posts_post, see posts.search. Triggers keep
+# it in sync with every write, bulk inserts and queryset updates included.
+# Only created on SQLite, other databases fall back to LIKE searches.
+CREATE_FTS = [
+    """
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        title, post_content, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, title, post_content)
+        VALUES (new.id, new.title, new.post_content);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, title, post_content)
+        VALUES ('delete', old.id, old.title, old.post_content);
+    END
+    """,
+    # counter and read_level updates don't touch the index
+    """
+    CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF title, post_content ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, title, post_content)
+        VALUES ('delete', old.id, old.title, old.post_content);
+        INSERT INTO posts_post_fts(rowid, title, post_content)
+        VALUES (new.id, new.title, new.post_content);
+    END
+    """,
+    "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')",
+]
+
+DROP_FTS = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TABLE IF EXISTS posts_post_fts',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_like_count_comment_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_FTS), run(DROP_FTS)),
+    ]
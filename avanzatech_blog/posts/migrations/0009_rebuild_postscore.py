@@ -0,0 +1,65 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:20
+
+import math
+from datetime import datetime, timezone
+from itertools import chain
+
+from django.db import migrations
+
+# posts.scores as of this migration, copied so later changes of the weights
+# or of settings.TRENDING_HALF_LIFE_HOURS don't change what it does
+LIKE_WEIGHT, COMMENT_WEIGHT = 1, 2
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+HALF_LIFE_HOURS = 24
+
+
+def trending_term(weight, at):
+    return math.log(weight) + (at - EPOCH).total_seconds() / (HALF_LIFE_HOURS * 3600) * math.log(2)
+
+
+def scores_from_events(events):
+    """{post id: (score, trending)} of the (post id, weight, created at) engagements."""
+    scores = {}
+    for post_id, weight, created_at in events:
+        score, trending = scores.get(post_id, (0, None))
+        term = trending_term(weight, created_at)
+        if trending is not None:
+            high = max(trending, term)
+            term = high + math.log1p(math.exp(-abs(trending - term)))
+        scores[post_id] = (score + weight, term)
+    return scores
+
+
+def rebuild_scores(apps, schema_editor):
+    """
+    Like the rebuild_post_scores command: the duplicate likes that
+    likes.0003 deleted were still counted in the trending scores.
+    """
+    PostScore = apps.get_model('posts', 'PostScore')
+    Like = apps.get_model('likes', 'Like')
+    Comment = apps.get_model('comments', 'Comment')
+
+    events = chain(
+        ((post_id, LIKE_WEIGHT, created_at) for post_id, created_at
+         in Like.objects.values_list('post_id', 'created_at').iterator(chunk_size=2000)),
+        ((post_id, COMMENT_WEIGHT, created_at) for post_id, created_at
+         in Comment.objects.values_list('post_id', 'created_at').iterator(chunk_size=2000)))
+    rebuilt = scores_from_events(events)
+    PostScore.objects.all().delete()
+    PostScore.objects.bulk_create(
+        [PostScore(post_id_id=post_id, score=score, trending=trending)
+         for post_id, (score, trending) in rebuilt.items()],
+        batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_postscore'),
+        ('likes', '0003_like_unique_post_author'),
+        ('comments', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_scores, migrations.RunPython.noop),
+    ]
@@ -1,29 +1,152 @@
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Abs, Exp, Greatest, Least, Ln
+from django.utils import timezone
 
 # Create your models here.
 
-
 from user.models import CustomUser
 
+from . import scores
+
+
+# permission name that grants nothing for its category
+NO_ACCESS = 'none'
+
+
+class AccessLevel(models.IntegerChoices):
+    # ordered from the widest audience to the narrowest one, so that
+    # "can read" becomes a range check on the column (read_level <= X)
+    PUBLIC = 0, 'public'
+    AUTHENTICATED = 1, 'authenticated'
+    TEAM = 2, 'team'
+    AUTHOR = 3, 'author'
+
+    @classmethod
+    def from_category(cls, category_name):
+        return cls.__members__.get(str(category_name).upper(), cls.AUTHOR)
+
+    @classmethod
+    def from_grants(cls, grants):
+        # grants: {category name: permission name}, as stored in postCategoryPermission
+        readable = [cls.from_category(category) for category, permission in grants.items()
+                    if permission and permission != NO_ACCESS]
+        # the author can always read their own post
+        return min(readable, default=cls.AUTHOR)
+
 
 class Post(models.Model):
     title = models.CharField(max_length=255, blank=False, null=False)
     post_content = models.TextField(blank=False, null=False)
     author = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     excerpt = models.TextField(blank=True, null=True)
-
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
+    # denormalized from postCategoryPermission, see postCategoryPermission.signals
+    read_level = models.PositiveSmallIntegerField(
+        choices=AccessLevel.choices, default=AccessLevel.AUTHOR, db_index=True)
+    # denormalized from likes and comments, only written through add_to_counts()
+    # and the reconcile_post_counts command
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    COUNTER_FIELDS = ('like_count', 'comment_count')
 
     def save(self, *args, **kwargs):
-        self.excerpt = self.post_content[:200]
+        self.fill_excerpt()
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # an instance loaded before a like or comment was added must not
+            # write its stale counters back
+            skipped = set(self.COUNTER_FIELDS).union(self.get_deferred_fields())
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in skipped]
         super(Post, self).save(*args, **kwargs)
 
-        
+    @classmethod
+    def add_to_counts(cls, post_id, **deltas):
+        """
+        Atomic F() update of the counters, e.g. add_to_counts(post.id, like_count=1).
+        Call it in the transaction of the like or comment write. Counters
+        never go below 0, even when they drifted.
+        """
+        cls.objects.filter(pk=post_id).update(
+            **{field_name: Greatest(F(field_name) + delta, 0) for field_name, delta in deltas.items()})
+
+    def fill_excerpt(self):
+        # also called directly by bulk inserts, which skip save()
+        self.excerpt = self.post_content[:200]
 
     def __str__(self):
         return self.title
 
-    # class Meta:
-    #     # Orden predeterminado: por fecha de creación ascendente
-    #     ordering = ['created_at']
+    class Meta:
+        # Orden predeterminado: por fecha de creación ascendente
+        # ordering = ['created_at']
+        indexes = [
+            # walked by PostKeysetPagination
+            models.Index(fields=['created_at', 'id'],
+                         name='post_created_at_id_idx'),
+            # walked by the NDJSON export, see PostExport
+            models.Index(fields=['modified_at', 'id'],
+                         name='post_modified_at_id_idx'),
+        ]
+
+
+class PostScore(models.Model):
+    """
+    Engagement score of a post with likes or comments, updated with every
+    like and comment write through record() (see posts.scores). Both scores
+    are indexed, so the top N posts are read with an N row index walk.
+    """
+    post_id = models.OneToOneField(Post, primary_key=True, related_name='ranking',
+                                   on_delete=models.CASCADE)
+    # weighted likes and comments
+    score = models.PositiveIntegerField(default=0)
+    # log of the time-weighted sum, see scores.decayed() for its current value
+    trending = models.FloatField()
+
+    def __str__(self):
+        return f"Score {self.score} of post {self.post_id_id}"
+
+    class Meta:
+        indexes = [
+            # walked by PostTop and PostTrending
+            models.Index(fields=['-score', '-post_id'], name='post_score_score_idx'),
+            models.Index(fields=['-trending', '-post_id'], name='post_score_trending_idx'),
+        ]
+
+    @classmethod
+    def record(cls, post_ids, weight, at=None):
+        """
+        Adds an engagement of `weight` made at `at` (now by default) to each
+        of `post_ids`, a negative weight takes back one made at `at`: one
+        UPDATE, plus one INSERT for the posts scored for the first time. Call
+        it in the transaction of the like or comment write, e.g.
+        record([like.post_id_id], scores.LIKE_WEIGHT).
+
+        When the time of an engagement taken back is unknown (at=None), only
+        the all-time score moves, its trending weight decays away.
+        """
+        post_ids = set(post_ids)
+        if not post_ids or not weight:
+            return
+        if weight < 0 and at is None:
+            cls.objects.filter(post_id__in=post_ids).update(score=Greatest(F('score') + weight, 0))
+            return
+        term = Value(scores.trending_term(abs(weight), at or timezone.now()))
+        trending = F('trending')
+        if weight > 0:
+            trending = Greatest(trending, term) + Ln(Value(1.0) + Exp(-Abs(trending - term)))
+        else:
+            trending = trending + Ln(Greatest(
+                Value(1.0) - Exp(Least(term - trending, Value(0.0))), Value(scores.MIN_RATIO)))
+
+        rows = cls.objects.filter(post_id__in=post_ids)
+        updated = rows.update(score=Greatest(F('score') + weight, 0), trending=trending)
+        if weight > 0 and updated < len(post_ids):
+            missing = post_ids.difference(rows.values_list('post_id', flat=True)) if updated else post_ids
+            cls.objects.bulk_create([cls(post_id_id=post_id, score=weight, trending=term.value)
+                                     for post_id in missing])
+
+    def current_trending(self, now=None):
+        return scores.decayed(self.trending, now or timezone.now())
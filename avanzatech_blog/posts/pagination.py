@@ -1,7 +1,242 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from hashlib import md5
+from urllib.parse import urlencode
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Count, Max, Q, Sum
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
-class PostPagination(PageNumberPagination):
+from .policy import policy_for
+
+
+# bumped on every write to the counted tables (see posts.signals), so cached
+# counts are only reused while nothing changed through the ORM
+COUNT_VERSION_KEY = 'pagination-count:version'
+
+
+def count_version():
+    return cache.get_or_set(COUNT_VERSION_KEY, 0, None)
+
+
+def bump_count_version():
+    try:
+        cache.incr(COUNT_VERSION_KEY)
+    except ValueError:
+        cache.set(COUNT_VERSION_KEY, 1, None)
+
+
+def encode_position(timestamp, pk):
+    """Opaque cursor of a (timestamp, id) position, see decode_position."""
+    position = f'{timestamp.isoformat()}|{pk}'
+    return urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+
+def decode_position(encoded):
+    """(timestamp, id) of an encode_position() cursor, ValueError when malformed."""
+    try:
+        timestamp, pk = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (TypeError, ValueError, UnicodeError) as exc:
+        raise ValueError(encoded) from exc
+
+
+class CachedCountPagination(PageNumberPagination):
+    """
+    PageNumberPagination serving its total count from the cache, per
+    visibility class of the requester and set of filters, for at most
+    settings.PAGINATION_COUNT_CACHE_TIMEOUT seconds. Writes that skip model
+    signals (bulk inserts, queryset updates) are only reflected once the
+    cached count expires. ?count=exact always runs the COUNT query.
+
+    The count is one of the `list_aggregates` computed together in a single
+    query, subclasses add the ones they need (see get_list_state).
+    """
+    count_query_param = 'count'
+    count_cache_prefix = 'pagination-count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, object_list, per_page):
+        paginator = Paginator(object_list, per_page)
+        paginator.count = self.get_count(object_list)
+        return paginator
+
+    def list_aggregates(self):
+        return {'count': Count('pk')}
+
+    def get_list_state(self, queryset, request):
+        """
+        list_aggregates() of the filtered queryset, cached like the count.
+        Kept on the paginator too: a list view that reads it for its
+        validators doesn't aggregate again for the count of the page, even
+        with ?count=exact.
+        """
+        cache_key = self.get_count_cache_key(request)
+        state = self.known_list_state(cache_key)
+
+        if state is None and request.query_params.get(self.count_query_param) != 'exact':
+            state = cache.get(cache_key)
+
+        if state is None:
+            state = queryset.order_by().aggregate(**self.list_aggregates())
+            cache.set(cache_key, state, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        self.list_state = (cache_key, state)
+        return state
+
+    async def aget_list_state(self, queryset, request):
+        """get_list_state() through the async cache and ORM, same cache entry."""
+        cache_key = self.get_count_cache_key(request)
+        state = self.known_list_state(cache_key)
+
+        if state is None and request.query_params.get(self.count_query_param) != 'exact':
+            state = await cache.aget(cache_key)
+
+        if state is None:
+            state = await queryset.order_by().aaggregate(**self.list_aggregates())
+            await cache.aset(cache_key, state, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        self.list_state = (cache_key, state)
+        return state
+
+    def known_list_state(self, cache_key):
+        """The state this paginator already read for `cache_key`, if any."""
+        key, state = getattr(self, 'list_state', (None, None))
+        return state if key == cache_key else None
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        paginate_queryset() for async views: the count comes from
+        aget_list_state() and the rows of the page from aiterator().
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        paginator = Paginator(queryset, page_size)
+        paginator.count = (await self.aget_list_state(queryset, request))['count']
+
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)))
+
+        bottom = (number - 1) * page_size
+        rows = [row async for row in queryset[bottom:bottom + page_size].aiterator()]
+        self.page = Page(rows, number, paginator)
+        return rows
+
+    def get_count(self, queryset):
+        return self.get_list_state(queryset, self.request)['count']
+
+    def get_count_cache_key(self, request):
+        # parameters that don't change which rows are counted
+        ignored = (self.page_query_param, self.page_size_query_param,
+                   self.count_query_param, 'fields', 'pagination')
+        filters = urlencode(sorted((key, value) for key, value in request.query_params.items()
+                                   if key not in ignored))
+        return '{}:{}:{}:{}'.format(
+            self.count_cache_prefix, count_version(), policy_for(request).visibility_key,
+            md5(filters.encode()).hexdigest())
+
+
+class PostPagination(CachedCountPagination):
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 10
+    count_cache_prefix = 'posts-count'
+
+    def list_aggregates(self):
+        # also the validators of conditional GETs, see posts.conditional
+        return dict(super().list_aggregates(),
+                    last_modified=Max('modified_at'),
+                    likes=Sum('like_count'),
+                    comments=Sum('comment_count'))
+
+
+class PostKeysetPagination(BasePagination):
+    """
+    Newest-first keyset pagination over the (created_at, id) index of Post.
+
+    The cursor holds the (created_at, id) of the last post of the previous
+    page, so every page is a range scan of page_size + 1 rows: no COUNT(*)
+    and no OFFSET, page N costs the same as page 1.
+    """
     page_size = 5
     page_size_query_param = 'page_size'
     max_page_size = 10
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset() for async views."""
+        return self.set_page([row async for row in self.page_queryset(queryset, request).aiterator()])
+
+    def page_queryset(self, queryset, request):
+        self.request = request
+        self.limit = self.get_page_size(request)
+        queryset = queryset.order_by('-created_at', '-id')
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            created_at, pk = position
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+        # one extra row tells whether there is a next page
+        return queryset[:self.limit + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.limit
+        self.page = results[:self.limit]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            return decode_position(encoded)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, post):
+        return encode_position(post.created_at, post.id)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
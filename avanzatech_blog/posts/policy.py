@@ -0,0 +1,110 @@
+from django.db.models import Q
+
+from .models import Post, AccessLevel
+from user.models import CustomUser
+
+
+class PostAccessPolicy:
+    """
+    "Can this user see this post" rule, compiled once per user.
+
+    - anonymous users read 'public' posts
+    - authenticated users read 'public' and 'authenticated' posts, the 'team'
+      posts of their own team and every post they authored
+    - staff users read every post
+    Only the author and staff can edit or delete a post.
+
+    The predicate only touches the denormalized Post.read_level column, so
+    both the queryset filter and the single-row check avoid the pivot table.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.is_staff = bool(user.is_staff)
+        self.is_anonymous = user.is_anonymous
+        self.user_id = user.id
+        self.team_id = getattr(user, 'team_id_id', None)
+        self.predicate = self._compile()
+        self.visibility_key = self._visibility_key()
+
+    def _compile(self):
+        if self.is_staff:
+            return Q()
+
+        if self.is_anonymous:
+            return Q(read_level=AccessLevel.PUBLIC)
+
+        # team members are resolved with a subquery on the author column
+        # instead of joining posts against users
+        team_members = CustomUser.objects.filter(
+            team_id=self.team_id).values('id')
+
+        return (
+            Q(read_level__lte=AccessLevel.AUTHENTICATED) |
+            Q(read_level=AccessLevel.TEAM, author_id__in=team_members) |
+            Q(author_id=self.user_id)
+        )
+
+    def _visibility_key(self):
+        # users sharing a key see exactly the same posts: the author-only
+        # slice makes every authenticated user a class of their own
+        if self.is_staff:
+            return 'staff'
+        if self.is_anonymous:
+            return 'anonymous'
+        return f'team:{self.team_id}:user:{self.user_id}'
+
+    # ------------------------------  querysets  ------------------------------#
+
+    def filter_posts(self, queryset):
+        """Posts of `queryset` the user can read."""
+        if self.is_staff:
+            return queryset
+        return queryset.filter(self.predicate)
+
+    def filter_editable_posts(self, queryset):
+        """Posts of `queryset` the user can edit or delete."""
+        if self.is_staff:
+            return queryset
+        if self.is_anonymous:
+            return queryset.none()
+        return queryset.filter(author_id=self.user_id)
+
+    def filter_related(self, queryset, field='post_id'):
+        """Rows of `queryset` (likes, comments...) whose post the user can read."""
+        if self.is_staff:
+            return queryset
+        visible_posts = self.filter_posts(Post.objects.all()).values('id')
+        return queryset.filter(**{f'{field}__in': visible_posts})
+
+    # ------------------------------  single row  -----------------------------#
+
+    def can_read(self, post):
+        """
+        In-memory check on a loaded post. Only 'team' posts read the author,
+        load them with select_related('author') to keep it query free.
+        """
+        if self.is_staff or post.read_level == AccessLevel.PUBLIC:
+            return True
+
+        if self.is_anonymous:
+            return False
+
+        if post.read_level == AccessLevel.AUTHENTICATED or post.author_id == self.user_id:
+            return True
+
+        return post.read_level == AccessLevel.TEAM and post.author.team_id_id == self.team_id
+
+    def can_edit(self, post):
+        if self.is_staff:
+            return True
+        return not self.is_anonymous and post.author_id == self.user_id
+
+
+def policy_for(request):
+    """The request user's compiled policy, cached on the request."""
+    policy = getattr(request, '_post_access_policy', None)
+    if policy is None or policy.user is not request.user:
+        policy = PostAccessPolicy(request.user)
+        request._post_access_policy = policy
+    return policy
@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .pagination import count_version
+from .policy import policy_for
+
+
+class LRUResponseCache:
+    """
+    Thread-safe in-process LRU, bounded by number of entries and by the sum
+    of the entry sizes. Entries also expire `timeout` seconds after being set.
+    """
+
+    def __init__(self, max_entries, max_bytes, timeout):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.size = 0
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()  # key: (value, size, expires at)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.timeout)
+            self.size += size
+
+            # least recently used first
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        self.size -= self._entries.pop(key)[1]
+
+
+# post list responses: (data, etag), cleared by posts.signals
+post_list_cache = LRUResponseCache(settings.POST_LIST_CACHE_MAX_ENTRIES,
+                                   settings.POST_LIST_CACHE_MAX_BYTES,
+                                   settings.POST_LIST_CACHE_TIMEOUT)
+
+
+def post_list_key(request, ignored=('count',)):
+    """
+    Users of one visibility class get the same list for the same URL. The
+    count version ties entries to writes seen by other processes too, as
+    long as they share the Django cache. ?count=exact shares the key of the
+    plain URL so that it refreshes its entry.
+    """
+    query = urlencode(sorted((key, values) for key, values in request.query_params.lists()
+                             if key not in ignored), doseq=True)
+    return (policy_for(request).visibility_key, count_version(),
+            request.build_absolute_uri(request.path), query)
+
+
+def response_size(data):
+    return len(json.dumps(data, cls=JSONEncoder))
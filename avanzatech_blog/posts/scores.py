@@ -0,0 +1,59 @@
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+
+# Engagement scores of the posts, see PostScore.
+#
+# The all-time score is the weighted sum of the likes and comments. The
+# trending score halves every TRENDING_HALF_LIFE_HOURS; rather than decaying
+# every row as time goes by, an engagement made at t adds
+#     weight * 2 ** ((t - EPOCH) / half life)
+# so that later engagements weigh exponentially more. Ranking by that sum is
+# ranking by the decayed score, the row of a post only changes when the post
+# is liked or commented. Sums are stored as natural logs so they never
+# overflow, decayed() gives the score as of now.
+
+LIKE_WEIGHT = 1
+COMMENT_WEIGHT = 2
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+# a trending sum taken back to (nearly) nothing is kept at this fraction
+# of its previous value, the log of 0 is undefined
+MIN_RATIO = 1e-12
+
+
+def half_lives(at):
+    return (at - EPOCH).total_seconds() / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def trending_term(weight, at):
+    """Log of the contribution of an engagement of `weight` (> 0) made at `at`."""
+    return math.log(weight) + half_lives(at) * math.log(2)
+
+
+def log_add(total, term):
+    """log(exp(total) + exp(term)), `total` is None for an empty sum."""
+    if total is None:
+        return term
+    high = max(total, term)
+    return high + math.log1p(math.exp(-abs(total - term)))
+
+
+def decayed(trending, now):
+    """Trending score as of `now`, in weight units."""
+    return math.exp(trending - half_lives(now) * math.log(2))
+
+
+def scores_from_events(events):
+    """
+    {post id: (score, trending)} of the (post id, weight, created at)
+    engagements, for rebuilds and bulk inserts.
+    """
+    scores = {}
+    for post_id, weight, created_at in events:
+        score, trending = scores.get(post_id, (0, None))
+        scores[post_id] = (score + weight, log_add(trending, trending_term(weight, created_at)))
+    return scores
@@ -0,0 +1,63 @@
+import re
+
+from django.db import connections
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+
+
+# FTS5 index of Post.title and Post.post_content, created and kept in sync by
+# the triggers of migration 0006_post_fts
+FTS_TABLE = 'posts_post_fts'
+
+# bm25 column weights: a match in the title counts more than one in the content
+BM25_WEIGHTS = (10.0, 1.0)
+
+TERM = re.compile(r'\w+\*?')
+
+
+class Bm25(Func):
+    """
+    bm25() rank of the post in the FTS5 query `expression`, lower is better.
+    bm25() only runs inside a full-text query, so each post is matched again
+    by rowid; the post is referenced through F('id'), whatever its alias.
+    """
+    template = (f'(SELECT bm25({FTS_TABLE}, {", ".join(map(str, BM25_WEIGHTS))}) '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %(expressions)s)')
+    arg_joiner = ' AND rowid = '
+    output_field = FloatField()
+
+    def __init__(self, expression, **extra):
+        super().__init__(Value(expression), F('id'), **extra)
+
+
+def match_expression(text):
+    """
+    FTS5 query matching every word of `text`. Words are quoted so that user
+    input can't be parsed as FTS5 syntax, a trailing * keeps a prefix search.
+    Returns '' when `text` has no word.
+    """
+    terms = []
+    for term in TERM.findall(text):
+        prefix = term.endswith('*')
+        terms.append('"{}"{}'.format(term.rstrip('*'), '*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def search_posts(queryset, text):
+    """
+    Posts of `queryset` matching `text`, best matches first. The match, the
+    bm25 rank and any filter applied to `queryset` (the access policy) run in
+    one SQL statement. Databases without the FTS table get a LIKE search.
+    """
+    expression = match_expression(text)
+    if not expression:
+        return queryset.none()
+
+    if connections[queryset.db].vendor != 'sqlite':
+        for term in TERM.findall(text):
+            word = term.rstrip('*')
+            queryset = queryset.filter(Q(title__icontains=word) | Q(post_content__icontains=word))
+        return queryset
+
+    matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression])
+    return queryset.filter(id__in=matches).annotate(rank=Bm25(expression)).order_by('rank', '-id')
@@ -1,10 +1,13 @@
 
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.forms import ValidationError
-from categories.models import Categories
-from permissions.models import Permissions
 from postCategoryPermission.models import postCategoryPermission
-from posts.models import Post
+from postCategoryPermission import lookups
+from posts.models import Post, AccessLevel
+from feed.models import FeedEntry
+from posts.signals import invalidate_cached_counts
+from django.db import transaction
 
 
 # class PostSerializerCreateList(serializers.ModelSerializer):
@@ -17,58 +20,170 @@ from posts.models import Post
 #         read_only_fields = ['created_at', 'author']
 
 
-class PostSerializerCreateList(serializers.ModelSerializer):
+class PostBatchSerializerCreate(serializers.ListSerializer):
+    """
+    List of posts sent to PostCreateOrList in a single request. Items are
+    validated one by one so that the valid ones can still be inserted, then
+    all posts and pivot rows are written with bulk inserts in one transaction.
+    """
+
+    def validate_items(self):
+        """Split initial_data into [(index, validated_data)] and [(index, errors)]."""
+        valid, invalid = [], []
+        for index, item in enumerate(self.initial_data):
+            try:
+                valid.append((index, self.child.run_validation(item)))
+            except serializers.ValidationError as exc:
+                invalid.append((index, exc.detail))
+        return valid, invalid
+
+    def create(self, validated_data):
+        posts, grants = [], []
+        for data in validated_data:
+            post_grants = self.child.pop_grants(data)
+            post = Post(read_level=AccessLevel.from_grants(post_grants), **data)
+            post.fill_excerpt()
+            posts.append(post)
+            grants.append(post_grants)
+
+        with transaction.atomic():
+            # primary keys are set on the instances by bulk_create
+            Post.objects.bulk_create(posts)
+            postCategoryPermission.objects.bulk_create([
+                row for post, post_grants in zip(posts, grants)
+                for row in postCategoryPermission.rows_for(post, post_grants)])
+            # bulk_create skips the signal that fans new posts out to the feeds
+            FeedEntry.fan_out(posts)
+            # and the ones that drop the cached counts and list pages, dropped
+            # once the posts are visible to the other requests
+            transaction.on_commit(lambda: invalidate_cached_counts(sender=Post))
+
+        return posts
+
+
+class SparseFieldsMixin:
+    """
+    ?fields=id,title,excerpt on a read request keeps only the listed fields in
+    the representation, and sparse_columns() gives the matching only() columns
+    so that the other ones (post_content first) are never read from the table.
+    """
+    fields_query_param = 'fields'
+    # loaded whatever is requested: access checks, keyset cursors and
+    # conditional GET validators read them
+    always_loaded = ('id', 'author', 'read_level', 'created_at', 'modified_at',
+                     'like_count', 'comment_count')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.requested_fields(self.context.get('request'))
+        if requested is not None:
+            for field_name in set(self.fields) - requested:
+                self.fields.pop(field_name)
+
+    @classmethod
+    def readable_fields(cls):
+        declared = cls._declared_fields
+        return [field_name for field_name in cls.Meta.fields
+                if field_name not in declared or not declared[field_name].write_only]
+
+    @classmethod
+    def requested_fields(cls, request):
+        """Set of requested field names, None when the request asks for all of them."""
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+
+        value = request.query_params.get(cls.fields_query_param)
+        if not value:
+            return None
+
+        requested = {field_name.strip() for field_name in value.split(',') if field_name.strip()}
+        unknown = requested.difference(cls.readable_fields())
+        if unknown:
+            raise serializers.ValidationError(
+                {cls.fields_query_param: [f'Unknown field(s): {", ".join(sorted(unknown))}.']})
+        return requested
+
+    @classmethod
+    def sparse_columns(cls, request):
+        """Arguments for queryset.only(), None to load every column."""
+        requested = cls.requested_fields(request)
+        if requested is None:
+            return None
+        return sorted(requested.union(cls.always_loaded))
+
+
+class PostSerializerCreateList(SparseFieldsMixin, serializers.ModelSerializer):
     # Define the fields for categories and permissions
-    public_permission = serializers.ChoiceField(
-        choices=Permissions.objects.values_list('name', flat=True))
+    # (choices are filled per instance from the cached Permissions table)
+    public_permission = serializers.ChoiceField(choices=[], write_only=True)
     authenticated_permission = serializers.ChoiceField(
-        choices=Permissions.objects.values_list('name', flat=True))
-    team_permission = serializers.ChoiceField(
-        choices=Permissions.objects.values_list('name', flat=True))
-    author_permission = serializers.ChoiceField(
-        choices=Permissions.objects.values_list('name', flat=True))
+        choices=[], write_only=True)
+    team_permission = serializers.ChoiceField(choices=[], write_only=True)
+    author_permission = serializers.ChoiceField(choices=[], write_only=True)
+
+    # payload field for each fixed category
+    CATEGORY_FIELDS = {
+        'public': 'public_permission',
+        'authenticated': 'authenticated_permission',
+        'team': 'team_permission',
+        'author': 'author_permission',
+    }
 
     class Meta:
         model = Post
         fields = ['id', 'title', 'post_content', 'author', 'excerpt', 'created_at',
+                  'like_count', 'comment_count',
                   'public_permission', 'authenticated_permission', 'team_permission', 'author_permission']
-        read_only_fields = ['created_at', 'author']
+        read_only_fields = ['created_at', 'author', 'like_count', 'comment_count']
+        list_serializer_class = PostBatchSerializerCreate
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        permission_names = list(lookups.permissions_by_name())
+        for field_name in self.CATEGORY_FIELDS.values():
+            # dropped by a sparse fieldset on read requests
+            if field_name in self.fields:
+                self.fields[field_name].choices = permission_names
+
+    def pop_grants(self, validated_data):
+        # Extract permissions from validated_data as {category name: permission name}
+        return {category: validated_data.pop(field_name)
+                for category, field_name in self.CATEGORY_FIELDS.items()}
 
     def create(self, validated_data):
-        # Extract permissions from validated_data
-        public_permission = validated_data.pop('public_permission')
-        authenticated_permission = validated_data.pop(
-            'authenticated_permission')
-        team_permission = validated_data.pop('team_permission')
-        author_permission = validated_data.pop('author_permission')
-
-        # Create the post
-        post = Post.objects.create(**validated_data)
-
-        # Get or create Permissions instances for the provided permissions
-        permissions = Permissions.objects.filter(name__in=[
-                                                 public_permission, authenticated_permission, team_permission, author_permission])
-
-        # Get or create Categories instances for the fixed categories
-        categories = Categories.objects.filter(
-            name__in=['public', 'authenticated', 'team', 'author'])
-
-        # Create postCategoryPermission instances
-        for category in categories:
-            permission = permissions.filter(name=category.name).first()
-            if permission:
-                postCategoryPermission.objects.create(
-                    post_id=post, category_id=category, permission_id=permission)
+        grants = self.pop_grants(validated_data)
 
-        return post
+        # read_level is derived in memory, bulk_create skips the pivot signals
+        post = Post(read_level=AccessLevel.from_grants(grants), **validated_data)
+
+        # the post and all its pivot rows are written in one transaction:
+        # one INSERT for the post and one bulk INSERT for the pivot rows
+        with transaction.atomic():
+            post.save()
+            postCategoryPermission.objects.bulk_create(
+                postCategoryPermission.rows_for(post, grants))
 
+        return post
 
 
-class PostSerializerRetrieveUpdateDestroy(serializers.ModelSerializer):
+class PostSerializerRetrieveUpdateDestroy(SparseFieldsMixin, serializers.ModelSerializer):
     description = serializers.SerializerMethodField
 
     class Meta:
         model = Post
         fields = ['id', 'title', 'post_content', 'author', 'excerpt',
-                  'created_at']
-        read_only_fields = ['created_at', 'author']
+                  'created_at', 'like_count', 'comment_count']
+        read_only_fields = ['created_at', 'author', 'like_count', 'comment_count']
+
+
+class PostRankingSerializer(PostSerializerCreateList):
+    """A post of the trending and top rankings, with its PostScore."""
+    score = serializers.IntegerField(source='ranking.score', read_only=True)
+    trending = serializers.SerializerMethodField()
+
+    class Meta(PostSerializerCreateList.Meta):
+        fields = PostSerializerCreateList.Meta.fields + ['score', 'trending']
+        read_only_fields = PostSerializerCreateList.Meta.read_only_fields + ['score', 'trending']
+
+    def get_trending(self, post):
+        return round(post.ranking.current_trending(), 6)
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_save, post_delete
+
+from .pagination import bump_count_version
+from .response_cache import post_list_cache
+
+
+# any write that can change a paginated list count invalidates the cached
+# counts and the cached list responses
+COUNTED_MODELS = [
+    'posts.Post',
+    'postCategoryPermission.postCategoryPermission',
+    'likes.Like',
+    'comments.Comment',
+]
+
+
+def invalidate_cached_counts(sender, **kwargs):
+    bump_count_version()
+    post_list_cache.clear()
+
+
+for model in COUNTED_MODELS:
+    post_save.connect(invalidate_cached_counts, sender=model)
+    post_delete.connect(invalidate_cached_counts, sender=model)
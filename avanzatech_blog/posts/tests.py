@@ -1,17 +1,48 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from django.db.models import Q
 
 # Create your tests here.
 
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
-from .models import Post
+from rest_framework.test import APIRequestFactory, APITestCase
+from .models import Post, PostScore, AccessLevel
+from . import scores
 from teams.models import Team
 from django.contrib.auth import get_user_model
 
 import pytest
 from rest_framework.test import APIClient
 from .factories import PostFactory
+from .policy import PostAccessPolicy
+from .response_cache import LRUResponseCache, post_list_cache
+from .bulk_import import NdjsonImporter
+from .search import search_posts
+from .views import PostTop, PostTrending
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.core.cache import cache
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from likes.models import Like
+from comments.models import Comment
+from postCategoryPermission.models import postCategoryPermission
+from postCategoryPermission import lookups
+from categories.models import Categories
+from permissions.models import Permissions
 from user.factories import CustomUserFactory, CustomUserSameTeamFactory
 from teams.factories import TeamFactory
 from user.models import CustomUser
@@ -1295,3 +1326,1298 @@ class PostNonAuthUserDelete(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertEqual(Post.objects.all().count(), 1)
         self.assertEqual(CustomUser.objects.all().count(), 1)
+
+
+# ______________________________________________________#
+
+
+class PostAccessPolicyTests(APITestCase):
+
+    def setUp(self):
+        self.team = TeamFactory()
+        self.user = CustomUserFactory(team_id=self.team)
+        self.teammate = CustomUserFactory(team_id=self.team)
+
+        self.posts = [
+            PostFactory(permission='public'),
+            PostFactory(permission='authenticated'),
+            PostFactory(permission='team', author=self.teammate),
+            PostFactory(permission='team'),
+            PostFactory(permission='author', author=self.user),
+            PostFactory(permission='author'),
+        ]
+
+    def assert_row_check_matches_queryset(self, user, expected_count):
+        policy = PostAccessPolicy(user)
+        visible = set(policy.filter_posts(
+            Post.objects.all()).values_list('id', flat=True))
+
+        self.assertEqual(len(visible), expected_count)
+        for post in Post.objects.select_related('author'):
+            self.assertEqual(policy.can_read(post), post.id in visible)
+
+    def test_anonymous_policy(self):
+        self.assert_row_check_matches_queryset(AnonymousUser(), 1)
+
+    def test_authenticated_policy(self):
+        self.assert_row_check_matches_queryset(self.user, 4)
+
+    def test_staff_policy(self):
+        self.assert_row_check_matches_queryset(
+            CustomUserFactory(is_staff=True), 6)
+
+    def test_only_author_and_staff_can_edit(self):
+        own_post, other_post = self.posts[4], self.posts[0]
+
+        self.assertTrue(PostAccessPolicy(self.user).can_edit(own_post))
+        self.assertFalse(PostAccessPolicy(self.user).can_edit(other_post))
+        self.assertFalse(PostAccessPolicy(AnonymousUser()).can_edit(other_post))
+        self.assertTrue(PostAccessPolicy(
+            CustomUserFactory(is_staff=True)).can_edit(other_post))
+
+
+# ______________________________________________________#
+
+
+class PostCreateWritePathTests(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUserFactory()
+        self.client.force_authenticate(user=self.user)
+
+    def test_create_post_does_not_query_lookup_tables(self):
+        url = reverse('postCreateOrList')
+        data = {
+            "title": "test_title",
+            "post_content": "test_content",
+            "public_permission": "none",
+            "authenticated_permission": "read",
+            "team_permission": "read",
+            "author_permission": "edit",
+        }
+        # warm the lookup-table cache
+        self.client.post(url, data, format='json')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        lookup_queries = [query['sql'] for query in queries.captured_queries
+                          if 'categories_categories' in query['sql']
+                          or 'permissions_permissions' in query['sql']]
+        self.assertEqual(lookup_queries, [])
+
+        post = Post.objects.get(pk=response.data['id'])
+        self.assertEqual(post.author, self.user)
+        self.assertEqual(post.read_level, AccessLevel.AUTHENTICATED)
+        self.assertEqual(
+            postCategoryPermission.objects.filter(post_id=post).count(), 4)
+
+    def test_create_post_writes_post_and_pivot_rows_in_two_inserts(self):
+        url = reverse('postCreateOrList')
+        data = {
+            "title": "test_title",
+            "post_content": "test_content",
+            "public_permission": "read",
+            "authenticated_permission": "read",
+            "team_permission": "edit",
+            "author_permission": "edit",
+        }
+        self.client.post(url, data, format='json')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        inserts = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(Post.objects.get(
+            pk=response.data['id']).read_level, AccessLevel.PUBLIC)
+
+
+# ______________________________________________________#
+
+
+class PostBatchCreateTests(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUserFactory()
+        self.client.force_authenticate(user=self.user)
+
+    def post_data(self, title, public_permission='read'):
+        return {
+            "title": title,
+            "post_content": f'{title} content',
+            "public_permission": public_permission,
+            "authenticated_permission": "read",
+            "team_permission": "read",
+            "author_permission": "edit",
+        }
+
+    def test_batch_create_posts(self):
+        url = reverse('postCreateOrList')
+        data = [self.post_data(f'title {i}') for i in range(5)]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(Post.objects.filter(author=self.user).count(), 5)
+        self.assertEqual(postCategoryPermission.objects.count(), 20)
+        self.assertEqual(Post.objects.get(
+            pk=response.data['results'][0]['id']).excerpt, 'title 0 content')
+        inserts = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)
+
+    def test_batch_create_drops_the_cached_lists(self):
+        url = reverse('postCreateOrList')
+        PostFactory(permission='public')
+        cache.clear()
+        post_list_cache.clear()
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(url).data['count'], 1)
+
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, [self.post_data('first'), self.post_data('second')], format='json')
+
+        self.client.force_authenticate(user=None)
+        response = self.client.get(url)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual({post['title'] for post in response.data['results']} & {'first', 'second'},
+                         {'first', 'second'})
+
+    def test_batch_create_reports_per_item_results(self):
+        url = reverse('postCreateOrList')
+        data = [self.post_data('ok'), self.post_data(''),
+                self.post_data('private', public_permission='none')]
+
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         [201, 400, 201])
+        self.assertIn('title', response.data['results'][1]['errors'])
+        self.assertEqual(Post.objects.get(title='private').read_level,
+                         AccessLevel.AUTHENTICATED)
+
+    def test_batch_create_rejects_empty_batch(self):
+        url = reverse('postCreateOrList')
+
+        response = self.client.post(url, [], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Post.objects.count(), 0)
+
+
+# ______________________________________________________#
+
+
+class PostKeysetPaginationTests(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUserFactory()
+        self.client.force_authenticate(user=self.user)
+        PostFactory.create_batch(12, permission='public')
+
+    def walk_pages(self, url):
+        pages = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append((response.data['results'], len(queries)))
+            url = response.data['next']
+        return pages
+
+    def test_cursor_pagination_walks_every_post_newest_first(self):
+        url = reverse('postCreateOrList') + '?pagination=cursor&page_size=5'
+
+        pages = self.walk_pages(url)
+
+        self.assertEqual([len(results) for results, _ in pages], [5, 5, 2])
+        ids = [post['id'] for results, _ in pages for post in results]
+        expected = list(Post.objects.order_by(
+            '-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_cursor_pagination_does_not_count(self):
+        url = reverse('postCreateOrList') + '?pagination=cursor&page_size=5'
+        # warms the lookup-table cache
+        self.assertNotIn('count', self.client.get(url).data)
+
+        pages = self.walk_pages(url)
+
+        self.assertEqual(len({query_count for _, query_count in pages}), 1)
+
+    def test_invalid_cursor(self):
+        url = reverse('postCreateOrList') + '?pagination=cursor&cursor=nope'
+
+        response = self.client.get(url, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+# ______________________________________________________#
+
+
+class PostCachedCountTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUserFactory()
+        PostFactory.create_batch(3, permission='public')
+
+    def test_count_is_served_from_cache_until_exact_is_requested(self):
+        url = reverse('postCreateOrList')
+        self.assertEqual(self.client.get(url).data['count'], 3)
+
+        # bulk inserts skip the signals that invalidate cached counts
+        Post.objects.bulk_create([Post(title='bulk', post_content='bulk', author=self.user,
+                                       read_level=AccessLevel.PUBLIC)])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).data['count'], 3)
+        self.assertFalse(any('COUNT(' in query['sql']
+                         for query in queries.captured_queries))
+
+        self.assertEqual(self.client.get(
+            url + '?count=exact').data['count'], 4)
+        self.assertEqual(self.client.get(url).data['count'], 4)
+
+    def test_exact_count_aggregates_once(self):
+        url = reverse('postCreateOrList')
+
+        for path in (url, reverse('postListAsync')):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(path + '?count=exact')
+
+            self.assertEqual(response.json()['count'], 3)
+            # the aggregates of the validators also give the count of the page
+            self.assertEqual(sum('COUNT(' in query['sql'] for query in queries.captured_queries), 1)
+
+    def test_counts_are_kept_per_visibility_class(self):
+        url = reverse('postCreateOrList')
+        PostFactory(permission='author', author=self.user)
+
+        self.assertEqual(self.client.get(url).data['count'], 3)
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(url).data['count'], 4)
+
+    def test_saving_a_post_invalidates_cached_counts(self):
+        url = reverse('postCreateOrList')
+        self.assertEqual(self.client.get(url).data['count'], 3)
+
+        PostFactory(permission='public')
+
+        self.assertEqual(self.client.get(url).data['count'], 4)
+
+
+# ______________________________________________________#
+
+
+class PostRetrieveUpdateDestroyQueriesTests(APITestCase):
+
+    def setUp(self):
+        self.team = TeamFactory()
+        self.user = CustomUserFactory(team_id=self.team)
+        self.teammate = CustomUserFactory(team_id=self.team)
+        self.client.force_authenticate(user=self.user)
+
+    def post_reads(self, queries):
+        return [query['sql'] for query in queries.captured_queries
+                if query['sql'].startswith('SELECT') and 'FROM "posts_post"' in query['sql']]
+
+    def test_retrieve_team_post_in_one_query(self):
+        post = PostFactory(permission='team', author=self.teammate)
+        url = reverse('postRetrieveUpdateDestroy', kwargs={'pk': post.id})
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], post.id)
+
+    def test_update_patch_and_delete_read_the_post_once(self):
+        post = PostFactory(permission='author', author=self.user)
+        url = reverse('postRetrieveUpdateDestroy', kwargs={'pk': post.id})
+        updated_data = {'title': 'Updated Title',
+                        'post_content': 'updated content'}
+
+        for method, data, expected_status in (('put', updated_data, status.HTTP_200_OK),
+                                              ('patch', {'title': 'Patched'}, status.HTTP_200_OK),
+                                              ('delete', None, status.HTTP_204_NO_CONTENT)):
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(self.client, method)(url, data, format='json')
+
+            self.assertEqual(response.status_code, expected_status)
+            self.assertEqual(len(self.post_reads(queries)), 1)
+
+    def test_teammate_cannot_update_team_post(self):
+        post = PostFactory(permission='team', author=self.teammate)
+        url = reverse('postRetrieveUpdateDestroy', kwargs={'pk': post.id})
+
+        response = self.client.patch(url, {'title': 'Patched'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+# ______________________________________________________#
+
+
+class PostSparseFieldsTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.team = TeamFactory()
+        self.user = CustomUserFactory(team_id=self.team)
+        self.teammate = CustomUserFactory(team_id=self.team)
+        self.client.force_authenticate(user=self.user)
+        PostFactory.create_batch(3, permission='public')
+
+    def content_reads(self, queries):
+        return [query['sql'] for query in queries.captured_queries
+                if 'FROM "posts_post"' in query['sql'] and 'post_content' in query['sql']]
+
+    def test_list_only_reads_requested_columns(self):
+        url = reverse('postCreateOrList') + '?fields=id,title,excerpt'
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        for post in response.data['results']:
+            self.assertEqual(set(post), {'id', 'title', 'excerpt'})
+        self.assertEqual(self.content_reads(queries), [])
+
+    def test_cursor_list_only_reads_requested_columns(self):
+        url = reverse('postCreateOrList') + '?pagination=cursor&page_size=2&fields=title'
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([set(post) for post in response.data['results']], [{'title'}] * 2)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(self.content_reads(queries), [])
+
+    def test_retrieve_only_reads_requested_columns(self):
+        post = PostFactory(permission='team', author=self.teammate)
+        url = reverse('postRetrieveUpdateDestroy', kwargs={'pk': post.id}) + '?fields=title'
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'title': post.title})
+        self.assertEqual(self.content_reads(queries), [])
+
+    def test_without_fields_every_field_is_returned(self):
+        response = self.client.get(reverse('postCreateOrList'))
+
+        self.assertEqual(set(response.data['results'][0]),
+                         {'id', 'title', 'post_content', 'author', 'excerpt', 'created_at',
+                          'like_count', 'comment_count'})
+
+    def test_unknown_or_write_only_fields_are_rejected(self):
+        for fields in ('title,secret', 'public_permission'):
+            response = self.client.get(reverse('postCreateOrList') + f'?fields={fields}')
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('fields', response.data)
+
+    def test_fields_are_ignored_by_writes(self):
+        post = PostFactory(permission='author', author=self.user)
+        url = reverse('postRetrieveUpdateDestroy', kwargs={'pk': post.id}) + '?fields=title'
+
+        response = self.client.patch(url, {'post_content': 'patched'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['post_content'], 'patched')
+
+
+# ______________________________________________________#
+
+
+class PostEngagementCountsTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUserFactory()
+        self.post = PostFactory(permission='public')
+        self.client.force_authenticate(user=self.user)
+
+    def counts(self):
+        self.post.refresh_from_db()
+        return self.post.like_count, self.post.comment_count
+
+    def test_likes_and_comments_update_the_counters(self):
+        self.client.post(reverse('likesCreate'),
+                         {'post_id': self.post.id, 'author': self.user.id}, format='json')
+        response = self.client.post(reverse('commentsCreate'),
+                                    {'post_id': self.post.id, 'author': self.user.id,
+                                     'comment_content': 'hi'}, format='json')
+        self.assertEqual(self.counts(), (1, 1))
+
+        # liking twice does not count twice
+        self.client.post(reverse('likesCreate'),
+                         {'post_id': self.post.id, 'author': self.user.id}, format='json')
+        self.assertEqual(self.counts(), (1, 1))
+
+        self.client.delete(reverse('likesDestroy', kwargs={'post_id': self.post.id, 'author': self.user.id}))
+        self.client.delete(reverse('commentsDestroy', kwargs={'pk': response.data['id']}))
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_counters_never_go_below_zero(self):
+        like = Like.objects.create(post_id=self.post, author=self.user)
+
+        self.client.delete(reverse('likesDestroy', kwargs={'post_id': self.post.id, 'author': self.user.id}))
+
+        self.assertFalse(Like.objects.filter(pk=like.pk).exists())
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_saving_a_stale_post_keeps_the_counters(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        Post.add_to_counts(self.post.pk, like_count=2, comment_count=1)
+
+        stale.title = 'renamed'
+        stale.save()
+
+        self.assertEqual(self.counts(), (2, 1))
+        self.assertEqual(self.post.title, 'renamed')
+
+    def test_list_returns_the_counters_in_one_query(self):
+        Post.add_to_counts(self.post.pk, like_count=3, comment_count=2)
+        self.client.get(reverse('postCreateOrList'))
+        # queryset updates skip the signals that drop cached list responses
+        post_list_cache.clear()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('postCreateOrList'))
+
+        result = response.data['results'][0]
+        self.assertEqual((result['like_count'], result['comment_count']), (3, 2))
+
+    def test_reconcile_command_fixes_drifted_counters(self):
+        other = PostFactory(permission='public')
+        Like.objects.create(post_id=self.post, author=self.user)
+        Comment.objects.create(post_id=other, author=self.user, comment_content='hi')
+        Post.objects.filter(pk=other.pk).update(like_count=7)
+
+        output = io.StringIO()
+        call_command('reconcile_post_counts', chunk_size=1, stdout=output)
+
+        self.assertIn('2 with drifted counts fixed', output.getvalue())
+        self.assertEqual(self.counts(), (1, 0))
+        other.refresh_from_db()
+        self.assertEqual((other.like_count, other.comment_count), (0, 1))
+
+    def test_reconcile_command_drops_the_cached_lists(self):
+        Post.objects.filter(pk=self.post.pk).update(like_count=7)
+        post_list_cache.clear()
+        self.assertEqual(self.client.get(reverse('postCreateOrList')).data['results'][0]['like_count'], 7)
+
+        call_command('reconcile_post_counts', stdout=io.StringIO())
+
+        self.assertEqual(self.client.get(reverse('postCreateOrList')).data['results'][0]['like_count'], 0)
+
+
+class PostEngagementBatchTests(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUserFactory()
+        self.posts = PostFactory.create_batch(3, permission='public')
+        self.private = PostFactory(permission='author')
+        Post.add_to_counts(self.posts[0].id, like_count=2, comment_count=1)
+        Post.add_to_counts(self.posts[1].id, comment_count=4)
+        Like.objects.create(post_id=self.posts[0], author=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def engagement(self, ids):
+        return self.client.get(reverse('postEngagement'), {'ids': ','.join(map(str, ids))})
+
+    def test_counts_and_liked_in_one_query(self):
+        ids = [self.posts[1].id, self.private.id, self.posts[0].id, 999999, self.posts[2].id]
+
+        with self.assertNumQueries(1):
+            response = self.engagement(ids)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [
+            {'post_id': self.posts[1].id, 'like_count': 0, 'comment_count': 4, 'liked': False},
+            {'post_id': self.posts[0].id, 'like_count': 2, 'comment_count': 1, 'liked': True},
+            {'post_id': self.posts[2].id, 'like_count': 0, 'comment_count': 0, 'liked': False},
+        ])
+
+    def test_author_sees_their_private_post(self):
+        self.client.force_authenticate(user=self.private.author)
+
+        response = self.engagement([self.private.id])
+
+        self.assertEqual([row['post_id'] for row in response.data['results']], [self.private.id])
+
+    def test_anonymous_users_liked_nothing(self):
+        self.client.force_authenticate(user=None)
+
+        response = self.engagement([post.id for post in self.posts])
+
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertFalse(any(row['liked'] for row in response.data['results']))
+
+    def test_ids_are_validated(self):
+        for ids in ['', 'a,b', ','.join(str(n) for n in range(1, 102))]:
+            response = self.client.get(reverse('postEngagement'), {'ids': ids})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('ids', response.data)
+
+
+class PostRankingTests(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUserFactory()
+        self.client.force_authenticate(user=self.user)
+        self.now = timezone.now()
+
+    def score_of(self, post):
+        return PostScore.objects.filter(post_id=post).values_list('score', flat=True).first()
+
+    def ranking_ids(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['id'] for post in response.data]
+
+    def test_likes_and_comments_update_the_score(self):
+        post = PostFactory(permission='public')
+        self.client.post(reverse('likesCreate'),
+                         {'post_id': post.id, 'author': self.user.id}, format='json')
+        response = self.client.post(reverse('commentsCreate'),
+                                    {'post_id': post.id, 'author': self.user.id,
+                                     'comment_content': 'hi'}, format='json')
+        self.assertEqual(self.score_of(post), scores.LIKE_WEIGHT + scores.COMMENT_WEIGHT)
+        trending = PostScore.objects.get(post_id=post).current_trending()
+        self.assertAlmostEqual(trending, scores.LIKE_WEIGHT + scores.COMMENT_WEIGHT, places=3)
+
+        self.client.delete(reverse('likesDestroy', kwargs={'post_id': post.id, 'author': self.user.id}))
+        self.client.delete(reverse('commentsDestroy', kwargs={'pk': response.data['id']}))
+
+        self.assertEqual(self.score_of(post), 0)
+        self.assertAlmostEqual(PostScore.objects.get(post_id=post).current_trending(), 0, places=6)
+
+    def test_trending_decays_and_top_does_not(self):
+        old, recent = PostFactory.create_batch(2, permission='public')
+        # three half-lives ago, 4 is down to 0.5
+        PostScore.record([old.id], 4, at=self.now - timedelta(hours=3 * settings.TRENDING_HALF_LIFE_HOURS))
+        PostScore.record([recent.id], 1, at=self.now)
+
+        self.assertEqual(self.ranking_ids('postTop'), [old.id, recent.id])
+        self.assertEqual(self.ranking_ids('postTrending'), [recent.id, old.id])
+        response = self.client.get(reverse('postTrending'))
+        self.assertAlmostEqual(response.data[1]['trending'], 0.5, places=3)
+        self.assertEqual(response.data[1]['score'], 4)
+
+    def test_record_matches_a_rebuild(self):
+        post = PostFactory(permission='public')
+        for hours, weight in [(30, 2), (5, 1), (1, 3)]:
+            PostScore.record([post.id], weight, at=self.now - timedelta(hours=hours))
+        PostScore.record([post.id], -2, at=self.now - timedelta(hours=30))
+
+        expected = scores.scores_from_events([
+            (post.id, 1, self.now - timedelta(hours=5)), (post.id, 3, self.now - timedelta(hours=1))])
+        post_score = PostScore.objects.get(post_id=post)
+        self.assertEqual(post_score.score, expected[post.id][0])
+        self.assertAlmostEqual(post_score.trending, expected[post.id][1], places=9)
+
+    def test_rankings_only_list_readable_posts(self):
+        public = PostFactory(permission='public')
+        private = PostFactory(permission='author')
+        PostScore.record([public.id], 1)
+        PostScore.record([private.id], 5)
+
+        self.assertEqual(self.ranking_ids('postTop'), [public.id])
+        self.client.force_authenticate(user=private.author)
+        self.assertEqual(self.ranking_ids('postTop'), [private.id, public.id])
+
+    def test_rankings_walk_past_unreadable_posts(self):
+        readable = PostFactory.create_batch(2, permission='public')
+        for post in readable:
+            PostScore.record([post.id], 1)
+        for post in PostFactory.create_batch(6, permission='author'):
+            PostScore.record([post.id], 9)
+
+        # the unreadable posts are skipped by the query itself
+        with self.assertNumQueries(1):
+            ids = self.ranking_ids('postTop', limit=2)
+
+        self.assertEqual(ids, sorted((post.id for post in readable), reverse=True))
+
+    def test_rankings_walk_the_score_index(self):
+        request = APIRequestFactory().get(reverse('postTop'))
+        request.user = CustomUserFactory()
+        for view in (PostTop, PostTrending):
+            plan = view(request=request, format_kwarg=None).get_queryset()[:10].explain()
+
+            self.assertIn(f'SCAN posts_postscore USING INDEX post_score_{view.score_field}_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_limit_reads_one_query(self):
+        posts = PostFactory.create_batch(5, permission='public')
+        for weight, post in enumerate(posts, 1):
+            PostScore.record([post.id], weight)
+        # warms the lookup-table cache
+        lookups.permissions_by_name()
+
+        with self.assertNumQueries(1):
+            ids = self.ranking_ids('postTop', limit=3, fields='id,title,score')
+
+        self.assertEqual(ids, [post.id for post in reversed(posts)][:3])
+
+    def test_rebuild_command_restores_the_scores(self):
+        post = PostFactory(permission='public')
+        Like.objects.create(post_id=post, author=self.user)
+        Comment.objects.create(post_id=post, author=self.user, comment_content='hi')
+        PostScore.record([post.id], 7)
+
+        output = io.StringIO()
+        call_command('rebuild_post_scores', chunk_size=1, stdout=output)
+
+        self.assertIn('1 with likes or comments scored', output.getvalue())
+        self.assertEqual(self.score_of(post), scores.LIKE_WEIGHT + scores.COMMENT_WEIGHT)
+
+
+# ______________________________________________________#
+
+
+class PostSearchTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.team = TeamFactory()
+        self.user = CustomUserFactory(team_id=self.team)
+        self.teammate = CustomUserFactory(team_id=self.team)
+        self.stranger = CustomUserFactory()
+        self.url = reverse('postSearch')
+
+    def post(self, title, content, permission='public', author=None):
+        return PostFactory(title=title, post_content=content, permission=permission,
+                           author=author or self.teammate)
+
+    def search(self, text, **params):
+        return self.client.get(self.url, {'q': text, **params})
+
+    def ids(self, response):
+        return [post['id'] for post in response.data['results']]
+
+    def test_title_matches_rank_first(self):
+        in_content = self.post('weekly notes', 'a short story about sqlite')
+        in_title = self.post('sqlite tuning', 'pragmas and indexes')
+        self.post('unrelated', 'nothing to see')
+
+        response = self.search('sqlite')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.ids(response), [in_title.id, in_content.id])
+        self.assertEqual(response.data['count'], 2)
+
+    def test_every_word_must_match_and_prefixes_are_supported(self):
+        both = self.post('search engines', 'ranking with bm25')
+        self.post('search party', 'nobody was found')
+
+        self.assertEqual(self.ids(self.search('search bm25')), [both.id])
+        self.assertEqual(self.ids(self.search('rank*')), [both.id])
+
+    def test_results_follow_the_access_policy(self):
+        public = self.post('release notes', 'public release')
+        team = self.post('release plan', 'team release', permission='team')
+        own = self.post('release draft', 'my release', permission='author', author=self.user)
+        self.post('release secret', 'author only release', permission='author')
+
+        self.assertEqual(self.ids(self.search('release')), [public.id])
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(set(self.ids(self.search('release'))), {public.id, team.id, own.id})
+
+        self.client.force_authenticate(user=self.stranger)
+        self.assertEqual(self.ids(self.search('release')), [public.id])
+
+    def test_match_rank_and_policy_run_in_one_query(self):
+        self.post('one query', 'search in one statement')
+        self.client.force_authenticate(user=self.user)
+        self.search('query', count='exact')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.search('query')
+
+        self.assertEqual(len(queries), 1)
+        self.assertIn('MATCH', queries.captured_queries[0]['sql'])
+        self.assertIn('bm25', queries.captured_queries[0]['sql'])
+
+    def test_search_chains_like_any_queryset(self):
+        first = self.post('sqlite tuning', 'pragmas')
+        second = self.post('notes', 'sqlite everywhere')
+
+        found = search_posts(Post.objects.only('id', 'title'), 'sqlite')
+        self.assertEqual([(post.id, post.title) for post in found],
+                         [(first.id, first.title), (second.id, second.title)])
+        self.assertEqual(found.filter(id=second.id).count(), 1)
+        # as a subquery the rank follows the alias of the inner posts table
+        nested = Post.objects.filter(id__in=search_posts(Post.objects.all(), 'pragmas').values('id'))
+        self.assertEqual(list(nested.values_list('id', flat=True)), [first.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        post = self.post('before', 'old words')
+
+        Post.objects.filter(pk=post.pk).update(title='after')
+        self.assertEqual(self.ids(self.search('after')), [post.id])
+        self.assertEqual(self.ids(self.search('before')), [])
+
+        post.delete()
+        self.assertEqual(self.ids(self.search('after')), [])
+
+    def test_fts_syntax_in_the_query_is_searched_literally(self):
+        post = self.post('quotes', 'he said "NEAR" AND left')
+
+        response = self.search('"near AND')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.ids(response), [post.id])
+
+    def test_admin_search_uses_the_index(self):
+        match = self.post('admin lookup', 'indexed')
+        self.post('other', 'not indexed either')
+        admin = CustomUserFactory(is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:posts_post_changelist'), {'q': 'lookup'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([post.id for post in response.context['cl'].result_list], [match.id])
+        self.assertFalse(any('LIKE' in query['sql'] for query in queries.captured_queries))
+
+    def test_query_is_required(self):
+        response = self.search('  ')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('q', response.data)
+
+
+# ______________________________________________________#
+
+
+class PostConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUserFactory()
+        self.post = PostFactory(permission='public', author=self.user)
+        self.detail_url = reverse('postRetrieveUpdateDestroy', kwargs={'pk': self.post.id})
+        self.list_url = reverse('postCreateOrList')
+
+    def test_detail_answers_304_for_a_matching_etag(self):
+        response = self.client.get(self.detail_url)
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        # the counters of the body don't move modified_at, no date covers it
+        self.assertNotIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_detail_is_not_revalidated_by_date_after_a_like(self):
+        since = http_date(time.time() + 60)
+        Post.add_to_counts(self.post.id, like_count=1)
+
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=since)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['like_count'], 1)
+
+    def test_list_is_not_revalidated_by_date_after_a_delete(self):
+        older = PostFactory(permission='public')
+        Post.objects.filter(id=older.id).update(modified_at=self.post.modified_at - timedelta(days=1))
+        response = self.client.get(self.list_url)
+        self.assertNotIn('Last-Modified', response)
+        since = http_date(time.time() + 60)
+
+        older.delete()
+
+        response = self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_detail_etag_changes_with_edits_counters_and_fields(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        self.assertNotEqual(self.client.get(self.detail_url + '?fields=title')['ETag'], etag)
+
+        Post.add_to_counts(self.post.id, like_count=1)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['like_count'], 1)
+
+        self.client.force_authenticate(user=self.user)
+        etag = response['ETag']
+        self.client.patch(self.detail_url, {'title': 'edited'}, format='json')
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_answers_304_without_querying(self):
+        etag = self.client.get(self.list_url)['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_etag_changes_with_the_visible_set(self):
+        etag = self.client.get(self.list_url)['ETag']
+
+        PostFactory(permission='public')
+
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_list_etag_depends_on_the_page_and_the_user(self):
+        etag = self.client.get(self.list_url)['ETag']
+
+        self.assertNotEqual(self.client.get(self.list_url + '?page_size=1')['ETag'], etag)
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_200_OK)
+
+
+# ______________________________________________________#
+
+
+class PostListResponseCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        post_list_cache.clear()
+        self.team = TeamFactory()
+        self.user = CustomUserFactory(team_id=self.team)
+        self.teammate = CustomUserFactory(team_id=self.team)
+        PostFactory.create_batch(2, permission='public')
+        self.url = reverse('postCreateOrList')
+
+    def test_anonymous_list_is_served_from_memory(self):
+        first = self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_entries_are_kept_per_visibility_class_and_page(self):
+        own = PostFactory(permission='author', author=self.user)
+        self.assertEqual(self.client.get(self.url).data['count'], 2)
+        self.assertEqual(self.client.get(self.url + '?page_size=1').data['count'], 2)
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(self.url).data['count'], 3)
+
+        # a teammate shares the team posts but not the author-only slice
+        self.client.force_authenticate(user=self.teammate)
+        self.assertNotIn(own.id, [post['id'] for post in self.client.get(self.url).data['results']])
+
+    def test_post_and_permission_writes_invalidate(self):
+        self.client.get(self.url)
+
+        post = PostFactory(permission='public')
+        self.assertEqual(self.client.get(self.url).data['count'], 3)
+
+        postCategoryPermission.objects.filter(post_id=post).delete()
+        category = Categories.objects.get(name='public')
+        permission = Permissions.objects.get(name='none')
+        postCategoryPermission.objects.create(post_id=post, category_id=category, permission_id=permission)
+        self.assertEqual(self.client.get(self.url).data['count'], 2)
+
+    def test_count_exact_refreshes_the_entry(self):
+        self.client.get(self.url)
+        Post.objects.bulk_create([Post(title='bulk', post_content='bulk', author=self.user,
+                                       read_level=AccessLevel.PUBLIC)])
+        self.assertEqual(self.client.get(self.url).data['count'], 2)
+
+        self.assertEqual(self.client.get(self.url + '?count=exact').data['count'], 3)
+        self.assertEqual(self.client.get(self.url).data['count'], 3)
+
+
+class PostAsyncReadTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        post_list_cache.clear()
+        self.team = TeamFactory()
+        self.author = CustomUserFactory(team_id=self.team)
+        self.teammate = CustomUserFactory(team_id=self.team)
+        self.outsider = CustomUserFactory()
+        self.staff = CustomUserFactory(is_staff=True)
+        for permission in ['public', 'authenticated', 'team', 'author']:
+            PostFactory(permission=permission, author=self.author)
+        self.own = Post.objects.filter(read_level=AccessLevel.AUTHOR).get()
+
+    def test_list_matches_the_sync_view_for_every_role(self):
+        for user in [None, self.outsider, self.teammate, self.author, self.staff]:
+            if user:
+                self.client.force_login(user)
+            for query in ['', '?page_size=2&page=2', '?fields=id,title', '?pagination=cursor']:
+                responses = []
+                for name in ['postCreateOrList', 'postListAsync']:
+                    cache.clear()
+                    post_list_cache.clear()
+                    responses.append(self.client.get(reverse(name) + query))
+                sync, async_ = responses
+                self.assertEqual(async_.status_code, sync.status_code, f'{user} {query}')
+                # same body but the links
+                self.assertEqual(async_.content.decode().replace('/post/async/', '/post/'),
+                                 sync.content.decode(), f'{user} {query}')
+
+    def test_detail_hides_posts_the_user_cant_read(self):
+        url = reverse('postRetrieveAsync', kwargs={'pk': self.own.id})
+        self.client.force_login(self.teammate)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_login(self.author)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['id'], self.own.id)
+
+        revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_uses_the_caches_of_the_sync_view(self):
+        # the aggregates are shared, only the page is read
+        self.client.get(reverse('postCreateOrList'))
+        with self.assertNumQueries(1):
+            first = self.client.get(reverse('postListAsync'))
+
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('postListAsync'))
+        self.assertEqual(second.json(), first.json())
+
+        revalidated = self.client.get(reverse('postListAsync'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_bad_requests(self):
+        response = self.client.get(reverse('postListAsync') + '?fields=secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.json())
+
+        response = self.client.get(reverse('postListAsync') + '?page=9')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # read only, writes go to the DRF views
+        self.client.force_login(self.author)
+        response = self.client.post(reverse('postListAsync'), {'title': 'async'})
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_concurrent_requests_are_served_by_one_event_loop(self):
+        urls = [reverse('postListAsync'), reverse('postListAsync') + '?fields=id,title']
+        urls.append(reverse('postRetrieveAsync', kwargs={'pk': self.own.id}))
+
+        responses = await asyncio.gather(*(self.async_client.get(url) for url in urls * 5))
+
+        self.assertEqual([response.status_code for response in responses],
+                         [200, 200, 404] * 5)
+
+
+class PostExportTests(APITestCase):
+
+    def setUp(self):
+        self.team = TeamFactory()
+        self.author = CustomUserFactory(team_id=self.team)
+        self.staff = CustomUserFactory(is_staff=True)
+        self.posts = [PostFactory(permission=permission, author=self.author)
+                      for permission in ['public', 'authenticated', 'team', 'author', 'public']]
+        self.url = reverse('postExport')
+
+    def export(self, query=''):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        chunks = list(response.streaming_content)
+        return [json.loads(line) for line in b''.join(chunks).decode().splitlines()], chunks
+
+    def test_exports_the_visible_posts_oldest_change_first(self):
+        rows, _ = self.export()
+        self.assertEqual([row['id'] for row in rows], [self.posts[0].id, self.posts[4].id])
+
+        self.client.force_authenticate(user=self.author)
+        rows, _ = self.export()
+        self.assertEqual([row['id'] for row in rows], [post.id for post in self.posts])
+        self.assertEqual(rows[0]['title'], self.posts[0].title)
+
+    def test_since_resumes_after_the_cursor_with_new_and_edited_posts(self):
+        self.client.force_authenticate(user=self.staff)
+        rows, _ = self.export()
+
+        rows_after, _ = self.export(f'?since={rows[1]["cursor"]}')
+        self.assertEqual([row['id'] for row in rows_after], [post.id for post in self.posts[2:]])
+
+        edited = self.posts[0]
+        edited.title = 'edited'
+        edited.save()
+        created = PostFactory(permission='public')
+
+        rows_after, _ = self.export(f'?since={rows[-1]["cursor"]}')
+        self.assertEqual([row['id'] for row in rows_after], [edited.id, created.id])
+        self.assertEqual(rows_after[0]['title'], 'edited')
+
+    @override_settings(POST_EXPORT_CHUNK_SIZE=2)
+    def test_streams_chunks_of_one_query(self):
+        self.client.force_authenticate(user=self.staff)
+        with self.assertNumQueries(1):
+            rows, chunks = self.export('?fields=id,title')
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [2, 2, 1])
+        self.assertEqual(set(rows[0]), {'id', 'title', 'cursor'})
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url + '?since=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class NdjsonImportTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        post_list_cache.clear()
+        self.author = CustomUserFactory()
+        self.reader = CustomUserFactory()
+        self.staff = CustomUserFactory(is_staff=True)
+        self.post = PostFactory(permission='public', author=self.author)
+        self.grants = {'public_permission': 'read', 'authenticated_permission': 'read',
+                       'team_permission': 'edit', 'author_permission': 'edit'}
+
+    def ndjson(self, *records):
+        return '\n'.join(record if isinstance(record, str) else json.dumps(record)
+                         for record in records) + '\n'
+
+    def import_file(self, content, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'import.ndjson')
+            with open(path, 'w') as source:
+                source.write(content)
+            stdout, stderr = io.StringIO(), io.StringIO()
+            call_command('import_ndjson', path, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), [json.loads(line) for line in stderr.getvalue().splitlines()]
+
+    def test_command_imports_records_and_reports_rejected_lines(self):
+        content = self.ndjson(
+            dict(self.grants, type='post', id=9001, author=self.author.id, title='imported', post_content='body'),
+            {'type': 'comment', 'post_id': 9001, 'author': self.reader.id, 'comment_content': 'hi'},
+            {'type': 'like', 'post_id': 9001, 'author': self.reader.id},
+            {'type': 'like', 'post_id': 9001, 'author': self.reader.id},
+            {'type': 'like', 'post_id': self.post.id, 'author': self.reader.id},
+            {'type': 'comment', 'post_id': 424242, 'author': self.reader.id, 'comment_content': 'lost'},
+            '{not json',
+            '',
+            {'type': 'share', 'post_id': 9001},
+            dict(self.grants, type='post', author=424242, title='orphan', post_content='body'),
+            dict(self.grants, type='post', author=self.author.id, post_content='no title'),
+        )
+        stdout, errors = self.import_file(content, chunk_size=3)
+
+        self.assertIn('1 posts, 1 comments and 2 likes imported, 6 lines rejected', stdout)
+        self.assertEqual([(error['line'], error['type']) for error in errors],
+                         [(4, 'like'), (6, 'comment'), (7, None), (9, 'share'), (10, 'post'), (11, 'post')])
+        self.assertIn('title', errors[-1]['errors'])
+
+        imported = Post.objects.get(id=9001)
+        self.assertEqual((imported.read_level, imported.like_count, imported.comment_count),
+                         (AccessLevel.PUBLIC, 1, 1))
+        self.assertEqual(postCategoryPermission.objects.filter(post_id=imported).count(), 4)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_a_chunk_costs_the_same_queries_whatever_its_size(self):
+        def queries(count):
+            content = self.ndjson(*[{'type': 'comment', 'post_id': self.post.id, 'author': self.reader.id,
+                                     'comment_content': f'comment {n}'} for n in range(count)])
+            with CaptureQueriesContext(connection) as captured:
+                self.import_file(content)
+            return len(captured)
+
+        # the first like or comment of a post also inserts its score row
+        PostScore.record([self.post.id], scores.LIKE_WEIGHT)
+        self.assertEqual(queries(5), queries(50))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 55)
+
+    def test_import_drops_the_cached_lists(self):
+        url = reverse('postCreateOrList')
+        self.assertEqual(self.client.get(url).data['count'], 1)
+        self.import_file(self.ndjson(
+            dict(self.grants, type='post', author=self.author.id, title='new', post_content='body')))
+        self.assertEqual(self.client.get(url).data['count'], 2)
+
+    def test_endpoint_is_staff_only_and_streams_the_events(self):
+        url = reverse('postImport') + '?chunk_size=1'
+        body = self.ndjson({'type': 'like', 'post_id': self.post.id, 'author': self.reader.id},
+                           {'type': 'like', 'post_id': self.post.id, 'author': 424242})
+
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.post(url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.post(url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        events = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual(len(events), 3)
+        self.assertEqual(events[1]['line'], 2)
+        self.assertEqual(events[-1]['progress'],
+                         {'lines': 2, 'posts': 0, 'comments': 0, 'likes': 1, 'errors': 1})
+        self.assertEqual(Like.objects.filter(post_id=self.post).count(), 1)
+
+    def test_a_failing_chunk_ends_the_stream_with_an_error(self):
+        url = reverse('postImport') + '?chunk_size=1'
+        body = self.ndjson({'type': 'like', 'post_id': self.post.id, 'author': self.author.id},
+                           {'type': 'like', 'post_id': self.post.id, 'author': self.reader.id},
+                           {'type': 'like', 'post_id': self.post.id, 'author': self.staff.id})
+        resolve = NdjsonImporter.resolve
+
+        def resolve_then_race(importer, records):
+            resolved = resolve(importer, records)
+            # the reader likes the post between the checks and the insert
+            if any(data['author'] == self.reader.id for _, data in records['like']):
+                Like.objects.create(post_id=self.post, author=self.reader)
+            return resolved
+
+        self.client.force_authenticate(user=self.staff)
+        with mock.patch.object(NdjsonImporter, 'resolve', resolve_then_race):
+            response = self.client.post(url, body, content_type='application/x-ndjson')
+            events = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(events), 2)
+        self.assertTrue(events[-1]['error'].startswith('IntegrityError'))
+        self.assertEqual(events[-1]['progress']['likes'], 1)
+        # the chunk before the failing one stays imported, the next one is not run
+        self.assertTrue(Like.objects.filter(post_id=self.post, author=self.author).exists())
+        self.assertFalse(Like.objects.filter(post_id=self.post, author=self.staff).exists())
+
+
+class LRUResponseCacheTests(TestCase):
+
+    def test_least_recently_used_entries_are_evicted_first(self):
+        lru = LRUResponseCache(max_entries=2, max_bytes=100, timeout=60)
+        lru.set('a', 1, 10)
+        lru.set('b', 2, 10)
+        lru.get('a')
+        lru.set('c', 3, 10)
+
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+    def test_size_is_bounded(self):
+        lru = LRUResponseCache(max_entries=10, max_bytes=25, timeout=60)
+        lru.set('a', 1, 10)
+        lru.set('b', 2, 10)
+        lru.set('c', 3, 10)
+        lru.set('too big', 4, 26)
+
+        self.assertEqual((len(lru), lru.size), (2, 20))
+        self.assertIsNone(lru.get('a'))
+        self.assertIsNone(lru.get('too big'))
+
+    def test_entries_expire(self):
+        lru = LRUResponseCache(max_entries=10, max_bytes=100, timeout=-1)
+        lru.set('a', 1, 10)
+
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.size, 0)
+
+
+# ______________________________________________________#
+
+
+class GenerateDatasetCommandTests(TestCase):
+
+    def generate(self, **options):
+        call_command('generate_dataset', teams=3, users=20, posts=50, shard_size=20,
+                     workers=1, stdout=io.StringIO(), **options)
+
+    def test_generates_every_table(self):
+        self.generate()
+
+        self.assertEqual(Team.objects.count(), 3)
+        self.assertEqual(CustomUser.objects.count(), 20)
+        self.assertEqual(Post.objects.count(), 50)
+        self.assertEqual(postCategoryPermission.objects.count(), 200)
+        self.assertTrue(Like.objects.exists())
+        self.assertTrue(Comment.objects.exists())
+        self.assertEqual(PostScore.objects.count(), Post.objects.filter(
+            Q(like_count__gt=0) | Q(comment_count__gt=0)).count())
+
+        # every team has a member and users share one precomputed hash
+        self.assertFalse(Team.objects.filter(customuser=None).exists())
+        self.assertEqual(CustomUser.objects.values('password').distinct().count(), 1)
+        self.assertTrue(CustomUser.objects.first().check_password('dataset'))
+
+    def test_read_level_matches_the_pivot_rows(self):
+        self.generate()
+
+        for post in Post.objects.all():
+            self.assertEqual(post.read_level, postCategoryPermission.sync_read_level(post.id))
+
+    def test_counters_match_the_likes_and_comments(self):
+        self.generate()
+        output = io.StringIO()
+
+        call_command('reconcile_post_counts', dry_run=True, stdout=output)
+
+        self.assertIn('0 with drifted counts found', output.getvalue())
+
+    def test_same_seed_gives_the_same_rows(self):
+        def likes():
+            # ids relative to the first generated post and user
+            first_post = Post.objects.order_by('id').first().id
+            first_user = CustomUser.objects.order_by('id').first().id
+            return [(post_id - first_post, author_id - first_user) for post_id, author_id
+                    in Like.objects.order_by('id').values_list('post_id', 'author_id')]
+
+        self.generate(seed=7)
+        first_run = likes()
+        Team.objects.all().delete()
+
+        self.generate(seed=7)
+
+        self.assertEqual(likes(), first_run)
+
+
+
+class GenerateDatasetSnapshotTests(TransactionTestCase):
+    # the SQLite backup cannot read the database from inside the transaction of a TestCase.
+    # Flushes of other TransactionTestCases drop the categories and permissions seeded by migrations
+    serialized_rollback = True
+
+    def test_snapshot_is_a_usable_sqlite_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dataset.sqlite3')
+            call_command('generate_dataset', teams=3, users=20, posts=50, shard_size=20,
+                         workers=2, snapshot=path, stdout=io.StringIO())
+
+            snapshot = sqlite3.connect(path)
+            try:
+                count = snapshot.execute('SELECT COUNT(*) FROM posts_post').fetchone()[0]
+            finally:
+                snapshot.close()
+
+        self.assertEqual(count, 50)
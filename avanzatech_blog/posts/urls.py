@@ -1,11 +1,21 @@
 from django.urls import path
 
-from posts.views import PostCreateOrList, PostRetrieveUpdateDestroy
+from posts.async_views import post_detail, post_list
+from posts.views import PostCreateOrList, PostExport, PostImport, PostRetrieveUpdateDestroy, PostSearch
+from posts.views import PostEngagement, PostTop, PostTrending
 
 
 urlpatterns = [
     path('', PostCreateOrList.as_view(), name='postCreateOrList'),
+    path('search/', PostSearch.as_view(), name='postSearch'),
+    path('export/', PostExport.as_view(), name='postExport'),
+    path('import/', PostImport.as_view(), name='postImport'),
+    path('engagement/', PostEngagement.as_view(), name='postEngagement'),
+    path('top/', PostTop.as_view(), name='postTop'),
+    path('trending/', PostTrending.as_view(), name='postTrending'),
     path('<int:pk>/', PostRetrieveUpdateDestroy.as_view(),
          name='postRetrieveUpdateDestroy'),
+    path('async/', post_list, name='postListAsync'),
+    path('async/<int:pk>/', post_detail, name='postRetrieveAsync'),
 
 ]
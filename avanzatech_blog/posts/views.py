@@ -1,31 +1,65 @@
-from .models import Post
+import json
 
+from .models import Post, PostScore
+from likes.models import Like
 
 
-from .serializers import PostSerializerCreateList, PostSerializerRetrieveUpdateDestroy
+
+from .serializers import PostRankingSerializer, PostSerializerCreateList, PostSerializerRetrieveUpdateDestroy
 
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.generics import ListCreateAPIView
+from rest_framework.generics import GenericAPIView, ListCreateAPIView, ListAPIView
 from rest_framework.generics import RetrieveUpdateDestroyAPIView
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import SAFE_METHODS
 
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+
+from rest_framework.views import APIView
 
-from .pagination import PostPagination
+from rest_framework.utils.encoders import JSONEncoder
+
+from .pagination import CachedCountPagination, PostPagination, PostKeysetPagination
+from .pagination import decode_position, encode_position
 
 from django_filters import rest_framework as filters
 
 from .filters import ListFilterCustom
 
+from .policy import policy_for
+
+from .search import search_posts
+
+from .bulk_import import NdjsonImporter
+
+from .conditional import list_etag, not_modified, post_etag, set_etag
+
+from .response_cache import post_list_cache, post_list_key, response_size
+
 from django.shortcuts import get_object_or_404
 
+from django.conf import settings
+
 from django.db import transaction
 
+from django.db.models import Exists, F, OuterRef, Q, Value
+
+from django.http import StreamingHttpResponse
+
+from avanzatech_blog.sqlite.writes import retrying_write
+
 # Create your views here.
 
 
+def sparse_queryset(queryset, serializer_class, request):
+    # ?fields= projects the SELECT down to the requested columns
+    columns = serializer_class.sparse_columns(request)
+    if columns:
+        return queryset.only(*columns)
+    return queryset
+
+
 # `/post` and `/post/<post_id>` list endpoint will only include posts the user has access to in the list and details endpoint will return a 404 if the user does not have view access to the post
 
 class PostCreateOrList(ListCreateAPIView):
@@ -35,54 +69,349 @@ class PostCreateOrList(ListCreateAPIView):
 
     filter_backends = (ListFilterCustom,)
 
+    # maximum number of posts accepted by a single batch create request
+    batch_max_size = 1000
+
+    @property
+    def paginator(self):
+        # ?pagination=cursor opts in to keyset pagination
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = PostKeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_queryset(self):
-        return Post.objects.all()
+        return sparse_queryset(Post.objects.all(), self.get_serializer_class(), self.request)
+
+    def list(self, request, *args, **kwargs):
+        # keyset pages never aggregate the whole visible set
+        if not isinstance(self.paginator, CachedCountPagination):
+            return super().list(request, *args, **kwargs)
 
+        # a page already built for the same visibility class and URL is
+        # served without touching the database, ?count=exact bypasses it
+        use_cache = request.query_params.get(self.paginator.count_query_param) != 'exact'
+        cache_key = post_list_key(request)
+        cached = post_list_cache.get(cache_key) if use_cache else None
+
+        if cached is not None:
+            data, etag = cached
+        else:
+            # the ETag comes from the cached aggregates that also give the count
+            queryset = self.filter_queryset(self.get_queryset())
+            state = self.paginator.get_list_state(queryset, request)
+            etag = list_etag(state, request, policy_for(request).visibility_key)
+            data = None
+
+        # the page is only serialized when the client copy is outdated
+        response = not_modified(request, etag)
+        if response is None and data is not None:
+            response = Response(data)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+            post_list_cache.set(cache_key, (response.data, etag),
+                                response_size(response.data))
+        return set_etag(response, etag)
+
+    @retrying_write
     def create(self, request, *args, **kwargs):
         # Check if the user is authenticated before allowing the creation of a new post
         if not request.user.is_authenticated:
             return Response({'error': 'Authentication required for creating a post.'}, status=status.HTTP_401_UNAUTHORIZED)
 
+        # a list payload creates a batch of posts in one request
+        if isinstance(request.data, list):
+            return self.create_batch(request)
+
         # Continue with the default create logic for authenticated users
         return super().create(request, *args, **kwargs)
 
+    def perform_create(self, serializer):
+        serializer.save(author=self.request.user)
+
+    def create_batch(self, request):
+        if not request.data or len(request.data) > self.batch_max_size:
+            return Response({'error': f'A batch must contain between 1 and {self.batch_max_size} posts.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        valid, invalid = serializer.validate_items()
+
+        posts = serializer.create(
+            [dict(data, author=request.user) for _, data in valid])
+
+        results = [{'index': index, 'status': status.HTTP_201_CREATED, 'id': post.id}
+                   for (index, _), post in zip(valid, posts)]
+        results += [{'index': index, 'status': status.HTTP_400_BAD_REQUEST, 'errors': errors}
+                    for index, errors in invalid]
+        results.sort(key=lambda result: result['index'])
+
+        if not invalid:
+            response_status = status.HTTP_201_CREATED
+        elif posts:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+
+        return Response({'created': len(posts), 'failed': len(invalid), 'results': results}, status=response_status)
+
    
 
 
-class PostRetrieveUpdateDestroy(RetrieveUpdateDestroyAPIView):
-    serializer_class = PostSerializerRetrieveUpdateDestroy
+class PostSearch(ListAPIView):
+    """
+    Full-text search: `/post/search/?q=words` lists the posts the user can
+    read that contain every word, best bm25 matches first.
+    """
+    serializer_class = PostSerializerCreateList
     pagination_class = PostPagination
+    filter_backends = (ListFilterCustom,)
 
-    queryset = Post.objects.all()
+    search_query_param = 'q'
 
     def get_queryset(self):
-        user_requester = self.request.user
-        post_instance = Post.objects.get(pk=self.kwargs['pk'])
+        # the swagger schema generator introspects the view without a query
+        if getattr(self, 'swagger_fake_view', False):
+            return Post.objects.none()
+
+        text = self.request.query_params.get(self.search_query_param, '').strip()
+        if not text:
+            raise ValidationError({self.search_query_param: ['A search query is required.']})
+
+        queryset = sparse_queryset(Post.objects.all(), self.get_serializer_class(), self.request)
+        return search_posts(queryset, text)
+
+
+class PostEngagement(APIView):
+    """
+    `/post/engagement/?ids=1,2,3`: like and comment counts of a page of posts
+    in one request and one query, and whether the user liked each of them.
+    Posts the user can't read (the LikeList and CommentList rules) are left
+    out, the others come in the order of `ids`.
+    """
+    ids_query_param = 'ids'
+    max_ids = 100
+
+    def get_ids(self, request):
+        try:
+            ids = [int(value) for value in request.query_params.get(self.ids_query_param, '').split(',') if value]
+        except ValueError:
+            raise ValidationError({self.ids_query_param: ['Must be comma separated post ids.']})
+        if not 1 <= len(ids) <= self.max_ids:
+            raise ValidationError({self.ids_query_param: [f'Between 1 and {self.max_ids} post ids.']})
+        return list(dict.fromkeys(ids))
+
+    def get(self, request, *args, **kwargs):
+        ids = self.get_ids(request)
+        # the counters are kept by every like and comment write, no COUNT(*)
+        # over the likes and comments tables
+        if request.user.is_authenticated:
+            liked = Exists(Like.objects.filter(post_id=OuterRef('pk'), author=request.user))
+        else:
+            liked = Value(False)
+        rows = {row['post_id']: row for row in policy_for(request).filter_posts(
+            Post.objects.filter(id__in=ids)).values(
+                'like_count', 'comment_count', post_id=F('id'), liked=liked)}
+        return Response({'results': [rows[post_id] for post_id in ids if post_id in rows]})
+
+
+class PostRanking(ListAPIView):
+    """
+    Base of the engagement rankings: the `?limit=` best scored posts the user
+    can read, in one query. SQLite walks the PostScore index of the ranking
+    and checks the access rules of each row with a primary key lookup of its
+    post (a correlated EXISTS), stopping after `limit` readable rows: the
+    posts the user can't read are skipped inside the query, never loaded.
+    """
+    serializer_class = PostRankingSerializer
+    pagination_class = None
+    filter_backends = ()
+
+    # PostScore field ranked on, with an index on (-field, -post_id)
+    score_field = None
+    limit_query_param = 'limit'
+    default_limit = 10
 
-        if self.request.method in SAFE_METHODS:
+    def get_queryset(self):
+        # EXISTS rather than a filter on the joined post, which makes SQLite
+        # scan the posts and sort them instead of walking the index
+        readable = policy_for(self.request).filter_posts(Post.objects.filter(id=OuterRef('post_id')))
+        return (PostScore.objects.filter(Exists(readable)).select_related('post_id__author')
+                .order_by(f'-{self.score_field}', '-post_id'))
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        return min(max(limit, 1), settings.POST_RANKING_MAX_SIZE)
+
+    def list(self, request, *args, **kwargs):
+        ranked = [row.post_id for row in self.get_queryset()[:self.get_limit()]]
+        return Response(self.get_serializer(ranked, many=True).data)
+
+
+class PostTop(PostRanking):
+    """`/post/top/`: all-time ranking, weighted likes and comments."""
+    score_field = 'score'
+
+
+class PostTrending(PostRanking):
+    """
+    `/post/trending/`: likes and comments weigh half as much every
+    TRENDING_HALF_LIFE_HOURS, see posts.scores.
+    """
+    score_field = 'trending'
+
+
+class PostExport(GenericAPIView):
+    """
+    `/post/export/` streams every post the user can read as newline-delimited
+    JSON, oldest change first. A single query walks the (modified_at, id)
+    index through iterator(), so memory stays flat whatever the export size.
+
+    Every line carries the `cursor` of its post, `?since=<cursor>` resumes
+    after it: only the posts created or edited since then are exported.
+    Deleted posts and posts that stopped being visible are not reported, new
+    likes and comments don't move modified_at.
+    """
+    serializer_class = PostSerializerRetrieveUpdateDestroy
+    pagination_class = None
+    filter_backends = (ListFilterCustom,)
 
-            if user_requester.is_staff:
-                return Post.objects.filter(pk=self.kwargs['pk'])
+    since_query_param = 'since'
+    invalid_cursor_message = 'Invalid cursor'
+    content_type = 'application/x-ndjson'
 
-            if user_requester.is_anonymous:
-                return Post.objects.filter(permission='public')
+    def get_queryset(self):
+        queryset = sparse_queryset(Post.objects.all(), self.get_serializer_class(), self.request)
+
+        since = self.request.query_params.get(self.since_query_param)
+        if since:
+            try:
+                modified_at, pk = decode_position(since)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(
+                Q(modified_at__gt=modified_at) | Q(modified_at=modified_at, id__gt=pk))
+
+        return queryset.order_by('modified_at', 'id')
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        # one serializer for every row, only to_representation() runs per post
+        serializer = self.get_serializer()
+        return StreamingHttpResponse(self.stream(queryset, serializer), content_type=self.content_type)
+
+    def stream(self, queryset, serializer):
+        chunk_size = settings.POST_EXPORT_CHUNK_SIZE
+        lines = []
+        for post in queryset.iterator(chunk_size=chunk_size):
+            row = serializer.to_representation(post)
+            row['cursor'] = encode_position(post.modified_at, post.id)
+            lines.append(json.dumps(row, cls=JSONEncoder) + '\n')
+            # written to the client a chunk at a time
+            if len(lines) == chunk_size:
+                yield ''.join(lines)
+                lines = []
+        if lines:
+            yield ''.join(lines)
+
+
+class PostImport(APIView):
+    """
+    Staff only: `POST /post/import/` with an NDJSON body of posts, comments
+    and likes (see posts.bulk_import). The body is read as a stream and
+    imported a chunk at a time, the response streams one JSON line per
+    rejected line and one progress line per chunk, the last one being the
+    summary of the import.
+    """
+    permission_classes = [IsAdminUser]
+
+    chunk_size_query_param = 'chunk_size'
+    max_chunk_size = 5000
+    content_type = 'application/x-ndjson'
+
+    def post(self, request, *args, **kwargs):
+        if request.stream is None:
+            raise ValidationError({'detail': 'An NDJSON body is required.'})
+
+        try:
+            chunk_size = int(request.query_params.get(self.chunk_size_query_param, 1000))
+        except ValueError:
+            raise ValidationError({self.chunk_size_query_param: ['A valid integer is required.']})
+        chunk_size = min(max(chunk_size, 1), self.max_chunk_size)
+
+        importer = NdjsonImporter(chunk_size=chunk_size)
+        return StreamingHttpResponse(self.stream(importer, request.stream), content_type=self.content_type)
+
+    def stream(self, importer, lines):
+        """
+        The events of the import as NDJSON lines. The import runs while the
+        response is streamed, after the exception handling of the view: a
+        chunk that fails (an id inserted meanwhile, the database staying
+        locked...) ends the stream with an `error` line and the totals of the
+        chunks imported before it, which stay imported.
+        """
+        try:
+            for event in importer.run(lines):
+                yield json.dumps(event, cls=JSONEncoder) + '\n'
+        except Exception as error:
+            yield json.dumps({'error': f'{type(error).__name__}: {error}',
+                              'progress': dict(importer.totals)}, cls=JSONEncoder) + '\n'
 
-            if post_instance.permission == 'team' and user_requester.team_id == post_instance.author.team_id:
-                return Post.objects.filter(pk=self.kwargs['pk'])
 
-            if post_instance.permission == 'authenticated' and user_requester.is_authenticated:
-                return Post.objects.filter(pk=self.kwargs['pk'])
+class PostRetrieveUpdateDestroy(RetrieveUpdateDestroyAPIView):
+    serializer_class = PostSerializerRetrieveUpdateDestroy
+    pagination_class = PostPagination
 
-            if post_instance.permission == 'public' and user_requester.is_authenticated:
-                return Post.objects.filter(pk=self.kwargs['pk'])
+    queryset = Post.objects.all()
 
-            if post_instance.permission == 'author' and user_requester.id == post_instance.author.id:
-                return Post.objects.filter(pk=self.kwargs['pk'])
+    def get_queryset(self):
+        policy = policy_for(self.request)
 
+        if self.request.method in SAFE_METHODS:
+            return policy.filter_posts(Post.objects.all())
+
+        return policy.filter_editable_posts(Post.objects.all())
+
+    def get_object(self):
+        # one read: the post comes with its author (for the team check), the
+        # access decision is made in memory and the instance is reused for
+        # serialization, update and delete
+        queryset = sparse_queryset(Post.objects.select_related('author'),
+                                   self.get_serializer_class(), self.request)
+        post = queryset.filter(pk=self.kwargs['pk']).first()
+        if post is None:
             raise NotFound
 
+        policy = policy_for(self.request)
+        if self.request.method in SAFE_METHODS:
+            allowed = policy.can_read(post)
         else:
+            allowed = policy.can_edit(post)
 
-            if user_requester.is_staff or user_requester.id == post_instance.author.id:
-                return Post.objects.filter(pk=self.kwargs['pk'])
+        # posts the user can't access answer 404
+        if not allowed:
             raise NotFound
+
+        self.check_object_permissions(self.request, post)
+        return post
+
+    def retrieve(self, request, *args, **kwargs):
+        post = self.get_object()
+        etag = post_etag(post, request)
+
+        response = not_modified(request, etag)
+        if response is None:
+            response = Response(self.get_serializer(post).data)
+        return set_etag(response, etag)
+
+    @retrying_write
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    @retrying_write
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)